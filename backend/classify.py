@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Score a JSONL file of questions with the Rose classifier.
+
+Each input line is {"question": "...", ...} (other keys are echoed back),
+a JSON string, or plain text. Output is one JSON object per line with the
+normalized question, predicted label and per-label scores. Input is read
+and classified in chunks, so memory use does not grow with file size.
+
+    python classify.py questions.jsonl -o scored.jsonl
+    cat questions.jsonl | python classify.py > scored.jsonl
+"""
+
+import argparse
+import contextlib
+import json
+import sys
+
+import server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file, or - for stdout")
+    parser.add_argument("--chunk-size", type=int, default=server.CLASSIFY_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    # Training/loading logs go to stderr so stdout stays pure JSONL.
+    with contextlib.redirect_stdout(sys.stderr):
+        server.train_model()
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    counts = {}
+    with src, dst:
+        for row in server.iter_classified(src, args.chunk_size):
+            dst.write(json.dumps(row) + "\n")
+            key = row.get("label", "error")
+            counts[key] = counts.get(key, 0) + 1
+    print(json.dumps({"counts": counts}), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
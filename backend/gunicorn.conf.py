@@ -0,0 +1,17 @@
+# Pre-fork deployment: `gunicorn -c gunicorn.conf.py server:app` from backend/.
+#
+# The app (and with it the encoder and RoseClassifier) is imported once in
+# the master with PRELOAD_MODEL=1, then forked; workers share the weights
+# copy-on-write instead of each loading MiniLM and retraining. The master
+# runs torch single-threaded; each worker switches to TORCH_NUM_THREADS
+# (default: all cores) after the fork.
+import os
+
+os.environ.setdefault("PRELOAD_MODEL", "1")
+os.environ.setdefault("SHARED_WEIGHTS", "1")
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
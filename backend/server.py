@@ -1,13 +1,32 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+import asyncio
+import bisect
+import copy
+import ctypes
+import fcntl
+import gc
+import hashlib
+import hmac
+import json
+import math
 import os
+import queue
 import random
+import re
 import threading
+import time
+import uuid
+import zlib
+import numpy as np
 import torch
 from torch import nn
-from torch.utils.data import DataLoader, TensorDataset
-from sentence_transformers import SentenceTransformer
 
 # =========================================================
 # CONFIG
@@ -17,8 +36,130 @@ EMBED_DIM = 384
 BATCH_SIZE = 64
 EPOCHS = 20
 LR = 1e-3
+
+# "fast" trains on preallocated full tensors with permutation shuffles and
+# early stopping on a seeded validation split; "dataloader" is the original
+# fixed-epoch DataLoader loop.
+TRAIN_MODE = os.environ.get("TRAIN_MODE", "fast")
+TRAIN_SEED = int(os.environ.get("TRAIN_SEED", "1234"))
+TRAIN_MAX_EPOCHS = int(os.environ.get("TRAIN_MAX_EPOCHS", "40"))
+TRAIN_PATIENCE = int(os.environ.get("TRAIN_PATIENCE", "5"))
+TRAIN_VAL_FRACTION = float(os.environ.get("TRAIN_VAL_FRACTION", "0.15"))
 MAX_QUESTIONS = 20
 
+# Trained classifier + training embeddings, keyed by knowledge-base hash.
+ARTIFACT_DIR = os.environ.get(
+    "ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts")
+)
+
+# Multi-worker mode: PRELOAD_MODEL loads/trains synchronously at import so a
+# pre-forking server (gunicorn --preload) shares one copy with its workers;
+# SHARED_WEIGHTS memory-maps encoder and classifier weights from
+# ARTIFACT_DIR so independently started workers share them via page cache.
+PRELOAD_MODEL = os.environ.get("PRELOAD_MODEL", "0") == "1"
+SHARED_WEIGHTS = os.environ.get("SHARED_WEIGHTS", "0") == "1"
+
+# Hash table of every generated question, answered without the encoder.
+ANSWER_INDEX_ENABLED = os.environ.get("ANSWER_INDEX_ENABLED", "1") == "1"
+
+# Keyword answerer that serves /api/game/ask until the neural model is ready.
+FALLBACK_ENABLED = os.environ.get("FALLBACK_ENABLED", "1") == "1"
+
+# Classifier engine: "mlp" trains RoseClassifier, "knn" answers by cosine
+# top-k voting over the training embeddings with no training at all.
+CLASSIFIER_ENGINE = os.environ.get("CLASSIFIER_ENGINE", "mlp")
+KNN_K = int(os.environ.get("KNN_K", "5"))
+# Below this best-match similarity the knn engine answers "i don't know".
+# "auto" calibrates it from the training set; "0" disables it.
+KNN_THRESHOLD = os.environ.get("KNN_THRESHOLD", "auto")
+KNN_THRESHOLD_QUANTILE = float(os.environ.get("KNN_THRESHOLD_QUANTILE", "0.01"))
+
+# Opt-in int8 dynamic quantization of the encoder and classifier Linear
+# layers; kept only if labels agree with fp32 on the generated dataset.
+INFERENCE_QUANTIZE = os.environ.get("INFERENCE_QUANTIZE", "0") == "1"
+QUANTIZE_MIN_AGREEMENT = float(os.environ.get("QUANTIZE_MIN_AGREEMENT", "0.98"))
+
+# Inference runs on its own pool so the event loop and cheap endpoints
+# stay responsive; TORCH_NUM_THREADS caps torch intra-op threads.
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+TORCH_NUM_THREADS = int(os.environ.get("TORCH_NUM_THREADS", "0"))
+
+# Optional JSON file {"concepts": {...}, "templates": [...]} overriding the
+# built-in knowledge base; POST /api/admin/reload (or the watcher, when
+# KNOWLEDGE_WATCH_SECONDS > 0) rebuilds the classifier from it in place.
+# The reload endpoint is disabled unless ADMIN_TOKEN is set.
+KNOWLEDGE_FILE = os.environ.get("KNOWLEDGE_FILE", "")
+KNOWLEDGE_WATCH_SECONDS = float(os.environ.get("KNOWLEDGE_WATCH_SECONDS", "0"))
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# "transformer" runs MiniLM per question; "static" uses per-token vectors
+# distilled from it once (model2vec-style) and mean-pools them in NumPy.
+ENCODER_BACKEND = os.environ.get("ENCODER_BACKEND", "transformer")
+STATIC_DISTILL_BATCH = int(os.environ.get("STATIC_DISTILL_BATCH", "512"))
+
+# Optional JSON file {"rewrites": [...], "guesses": [...]} replacing the
+# built-in NORMALIZATION_RULES / GUESS_PHRASES below.
+RULES_FILE = os.environ.get("RULES_FILE", "")
+
+# Puzzles beyond the built-in rose: PUZZLES_DIR/<target>.json, each
+# {"concepts": {label: [...]}, "guesses": [...]}. They share the encoder and
+# a concept-embedding bank; each is a small per-target head, built on first
+# use and evicted LRU once loaded heads exceed PUZZLE_HEAD_BUDGET_BYTES.
+PUZZLES_DIR = os.environ.get("PUZZLES_DIR", "")
+PUZZLE_HEAD_BUDGET_BYTES = int(os.environ.get("PUZZLE_HEAD_BUDGET_BYTES", str(4 << 20)))
+DEFAULT_TARGET = "rose"
+
+# Lean memory: once the model is ready, drop the in-memory embedding store
+# (reloaded from disk on demand) and hand freed heap back to the OS.
+# INFERENCE_DTYPE=bfloat16|float16 runs the encoder and classifier in half
+# precision on CPU, kept only if labels agree with fp32 as often as
+# QUANTIZE_MIN_AGREEMENT (ignored when int8 quantization is active).
+RELEASE_TRAINING_MEMORY = os.environ.get("RELEASE_TRAINING_MEMORY", "1") == "1"
+INFERENCE_DTYPE = os.environ.get("INFERENCE_DTYPE", "float32")
+
+# INFERENCE_COMPILE=trace|compile serves the classifier from a TorchScript
+# trace or a torch.compile graph ("compile" also compiles a transformer
+# encoder), fed inputs padded to fixed batch/sequence buckets. With
+# INFERENCE_WARMUP every bucket is run once before readiness is reported.
+INFERENCE_COMPILE = os.environ.get("INFERENCE_COMPILE", "off")
+INFERENCE_WARMUP = os.environ.get("INFERENCE_WARMUP", "1") == "1"
+INFER_BATCH_BUCKETS = tuple(sorted(
+    int(b) for b in os.environ.get("INFER_BATCH_BUCKETS", "1,2,4,8,16,32").split(",")
+))
+INFER_SEQ_BUCKETS = tuple(sorted(
+    int(b) for b in os.environ.get("INFER_SEQ_BUCKETS", "16,32,64,128").split(",")
+))
+
+# Bulk classification (/api/classify/batch and classify.py) chunk size.
+# Bulk chunks run on their own CLASSIFY_WORKERS pool, so a large upload
+# queues behind other uploads rather than in front of game questions.
+CLASSIFY_CHUNK_SIZE = int(os.environ.get("CLASSIFY_CHUNK_SIZE", "256"))
+CLASSIFY_WORKERS = int(os.environ.get("CLASSIFY_WORKERS", "1"))
+
+# Session store: lock-striped shards, each an LRU with idle TTL.
+SESSION_SHARDS = int(os.environ.get("SESSION_SHARDS", "16"))
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", "3600"))
+SESSION_MAX_ENTRIES = int(os.environ.get("SESSION_MAX_ENTRIES", "50000"))
+SESSION_HEADER = "X-Session-Id"
+# "memory" keeps games in this process; "redis" shares them across replicas.
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+REDIS_KEY_PREFIX = os.environ.get("REDIS_KEY_PREFIX", "rose:session:")
+
+# Bounded LRU of question embeddings keyed by normalized text.
+EMBED_CACHE_SIZE = int(os.environ.get("EMBED_CACHE_SIZE", "4096"))
+
+# Micro-batching of concurrent /api/game/ask cache misses.
+INFER_BATCHING = os.environ.get("INFER_BATCHING", "1") == "1"
+INFER_MAX_BATCH = int(os.environ.get("INFER_MAX_BATCH", "32"))
+INFER_MAX_WAIT_MS = float(os.environ.get("INFER_MAX_WAIT_MS", "5"))
+
+# Admission control: at most INFER_QUEUE_LIMIT questions in inference at
+# once (excess get 429), each dropped with 503 once INFER_DEADLINE_MS pass.
+INFER_QUEUE_LIMIT = int(os.environ.get("INFER_QUEUE_LIMIT", "64"))
+INFER_DEADLINE_MS = float(os.environ.get("INFER_DEADLINE_MS", "2000"))
+SHED_RETRY_AFTER = int(os.environ.get("SHED_RETRY_AFTER", "1"))
+
 LABELS = {
     "too far away": 0,
     "no": 1,
@@ -76,6 +217,22 @@ TEMPLATES = [
     "Does it belong to {}?"
 ]
 
+# Substring rewrites for normalize_question. Earlier rules win when several
+# phrases occur in one question.
+NORMALIZATION_RULES = [
+    {"phrases": ["living thing", "can it die", "does it die"], "to": "is it a living thing?"},
+    {"phrases": ["can it grow", "does it grow"], "to": "is it a plant?"},
+    {"phrases": ["does it breathe", "does it eat"], "to": "is it an animal?"},
+]
+
+# Whole-message phrasings that count as guessing the answer outright;
+# {target} is the session's secret.
+GUESS_PHRASES = [
+    "{target}", "a {target}", "the {target}", "is it {target}", "is it a {target}",
+    "its a {target}", "it's a {target}", "i think it's a {target}",
+    "i think it is a {target}", "the answer is {target}",
+]
+
 
 # =========================================================
 # MODEL DEFINITION
@@ -83,6 +240,7 @@ TEMPLATES = [
 class RoseClassifier(nn.Module):
     def __init__(self):
         super().__init__()
+        self.dtype = torch.float32
         self.net = nn.Sequential(
             nn.Linear(EMBED_DIM, 256),
             nn.ReLU(),
@@ -90,261 +248,2765 @@ class RoseClassifier(nn.Module):
         )
 
     def forward(self, x):
-        return self.net(x)
+        # Quantized Linear layers reject 1-D input, so always run a batch.
+        squeeze = x.dim() == 1
+        out = self.net(x.to(self.dtype).reshape(-1, EMBED_DIM))
+        return out[0] if squeeze else out
 
 
-# =========================================================
-# GLOBAL STATE
-# =========================================================
-encoder = None
-model = None
-model_ready = False
+class NearestNeighbourClassifier(nn.Module):
+    """Cosine top-k voting over a normalized matrix of labelled embeddings.
 
-game_state = {
-    "question_count": 0,
-    "game_over": False,
-    "guessed_correctly": False,
-}
+    Same call contract as RoseClassifier (embeddings in, per-label scores
+    out), so it drops into every inference path unchanged. A knowledge
+    reload just rebuilds the matrix from stored embeddings; nothing is
+    trained.
+    """
+
+    def __init__(self, embeddings, labels, k=KNN_K, threshold=0.0):
+        super().__init__()
+        self.k = k
+        self.threshold = threshold
+        self.register_buffer("matrix", nn.functional.normalize(embeddings.float(), dim=-1))
+        self.register_buffer("labels", labels.long())
 
+    def calibrate(self, quantile=KNN_THRESHOLD_QUANTILE):
+        self.threshold = calibrate_threshold(self.matrix, quantile)
+        return self.threshold
 
-# =========================================================
-# DATASET GENERATION
-# =========================================================
-def generate_dataset(size=2000):
-    data = []
-    for label, concepts in CONCEPTS.items():
-        for c in concepts:
-            for t in TEMPLATES:
-                data.append((t.format(c), LABELS[label]))
+    def forward(self, x):
+        squeeze = x.dim() == 1
+        x = nn.functional.normalize(x.to(self.matrix.dtype).reshape(-1, self.matrix.shape[1]), dim=-1)
+        votes = knn_votes((x @ self.matrix.T).float(), self.labels, self.k, self.threshold)
+        return votes[0] if squeeze else votes
 
-    yes_id = [
-        "is it rose?", "is it a rose?",
-        "is the answer rose?", "are you thinking of rose?"
-    ]
-    no_id = [
-        "is it tulip?", "is it lotus?",
-        "is it dog?", "is it car?"
-    ]
-    for q in yes_id:
-        data.append((q, LABELS["yes"]))
-    for q in no_id:
-        data.append((q, LABELS["no"]))
 
-    random.shuffle(data)
-    return data[:size]
+def calibrate_threshold(matrix, quantile=KNN_THRESHOLD_QUANTILE):
+    """A low quantile of each normalized row's best similarity to any
+    *other* row, i.e. what in-domain questions score."""
+    sims = matrix @ matrix.T
+    sims.fill_diagonal_(-1.0)
+    return torch.quantile(sims.max(dim=1).values, quantile).item()
 
 
-# =========================================================
-# NORMALIZATION
-# =========================================================
-def normalize_question(q):
-    q = q.lower().strip()
-    if "living thing" in q:
-        return "is it a living thing?"
-    if any(x in q for x in ["can it die", "does it die"]):
-        return "is it a living thing?"
-    if any(x in q for x in ["can it grow", "does it grow"]):
-        return "is it a plant?"
-    if any(x in q for x in ["does it breathe", "does it eat"]):
-        return "is it an animal?"
-    return q
+def knn_votes(sims, row_labels, k, threshold):
+    """Similarity-weighted top-k label votes; rows whose best match falls
+    under `threshold` vote "i don't know"."""
+    top, idx = sims.topk(min(k, sims.shape[1]), dim=-1)
+    votes = torch.zeros(sims.shape[0], len(LABELS))
+    votes.scatter_add_(1, row_labels[idx], top.clamp(min=0))
+    if threshold > 0:
+        unsure = top[:, 0] < threshold
+        votes[unsure] = 0.0
+        votes[unsure, LABELS["i don't know"]] = 1.0
+    return votes
 
 
 # =========================================================
-# TRAINING FUNCTION (runs in background thread)
+# METRICS (Prometheus text exposition, no client library)
 # =========================================================
-def train_model():
-    global encoder, model, model_ready
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
 
-    print("[ML] Generating dataset...")
-    dataset = generate_dataset()
-    print(f"[ML] Samples: {len(dataset)}")
 
-    print("[ML] Loading sentence transformer...")
-    encoder_local = SentenceTransformer(MODEL_NAME)
+class Histogram:
+    """Fixed-bucket histogram; an observation is a bisect plus a short
+    critical section, cheap enough to leave on in production."""
 
-    texts, labels = zip(*dataset)
-    print("[ML] Encoding texts...")
-    embeddings = encoder_local.encode(list(texts), convert_to_tensor=True)
-    labels_tensor = torch.tensor(labels)
+    def __init__(self, name, doc, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
 
-    model_local = RoseClassifier()
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
 
-    loader = DataLoader(
-        TensorDataset(embeddings, labels_tensor),
-        batch_size=BATCH_SIZE,
-        shuffle=True
-    )
-    optimizer = torch.optim.Adam(model_local.parameters(), lr=LR)
-    loss_fn = nn.CrossEntropyLoss()
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
 
-    print("[ML] Training...")
-    for epoch in range(EPOCHS):
-        total = 0
-        for x, y in loader:
-            optimizer.zero_grad()
-            loss = loss_fn(model_local(x), y)
-            loss.backward()
-            optimizer.step()
-            total += loss.item()
-        if (epoch + 1) % 5 == 0:
-            print(f"[ML] Epoch {epoch+1}/{EPOCHS} | Loss: {total:.4f}")
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
 
-    # Assign to global
-    encoder = encoder_local
-    model = model_local
-    model_ready = True
-    print("[ML] Training complete. Model ready!")
 
+class Counter:
+    def __init__(self, name, doc, labelnames=()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self.values = {}
+        self._lock = threading.Lock()
 
-# =========================================================
-# FASTAPI APP
-# =========================================================
-app = FastAPI()
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
 
-cors_origins = os.environ.get("CORS_ORIGINS", "*")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=cors_origins.split(","),
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self.values.items())
+        for labelvalues, value in items:
+            lines.append(f"{self.name}{format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
 
 
-@app.on_event("startup")
-async def startup_event():
-    thread = threading.Thread(target=train_model, daemon=True)
-    thread.start()
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
 
 
-# =========================================================
-# PYDANTIC MODELS
-# =========================================================
-class QuestionRequest(BaseModel):
-    question: str
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{k}="{escape_label(v)}"' for k, v in zip(names, values))
+    return "{" + pairs + "}"
 
 
-class GuessRequest(BaseModel):
-    guess: str
+def render_samples(name, doc, kind, samples):
+    lines = [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{format_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return lines
 
 
-# =========================================================
-# API ENDPOINTS
-# =========================================================
-@app.get("/api/")
-def root():
-    return {"message": "Rose Day AI Game API"}
+def gauge(name, doc, samples):
+    """Render a gauge from `[(labels_dict, value), ...]`."""
+    return render_samples(name, doc, "gauge", samples)
 
 
-@app.get("/api/game/status")
-def get_game_status():
+def counter(name, doc, samples):
+    """Render a counter from totals kept elsewhere, e.g. in a stats dict."""
+    return render_samples(name, doc, "counter", samples)
+
+
+startup_report = []
+
+
+@contextmanager
+def startup_step(name):
+    """Log and record wall time and RSS around one step of model startup."""
+    before = process_rss_bytes()
+    start = time.perf_counter()
+    yield
+    after = process_rss_bytes()
+    step = {
+        "step": name,
+        "seconds": round(time.perf_counter() - start, 4),
+        "rss_before_mb": megabytes(before),
+        "rss_after_mb": megabytes(after),
+    }
+    startup_report.append(step)
+    print(f"[ML] {name}: {step['seconds']}s, RSS {step['rss_before_mb']} -> {step['rss_after_mb']} MB")
+
+
+def process_rss_bytes():
+    """Current resident set size, or None where /proc is unavailable (the
+    portable getrusage only knows the peak, a different quantity)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def megabytes(n):
+    return round(n / 2**20, 1) if n is not None else None
+
+
+NORMALIZE_SECONDS = Histogram("rose_normalize_seconds", "Time spent in normalize_question.")
+ENCODE_SECONDS = Histogram("rose_encode_seconds", "Time per encoder.encode call (single or batched).")
+CLASSIFY_SECONDS = Histogram("rose_classify_seconds", "Time per classifier forward pass.")
+PREDICTIONS = Counter("rose_predictions_total", "Answers served by label and engine.", ("label", "engine"))
+NOT_READY = Counter("rose_not_ready_total", "Requests rejected with 503 while no engine was ready.", ("endpoint",))
+SHED = Counter("rose_shed_total", "Inference requests dropped by admission control.", ("reason",))
+training_epochs = []
+training_report = {"mode": TRAIN_MODE}
+
+
+def record_epoch(epoch, loss, seconds):
+    training_epochs.append((epoch, loss, seconds))
+
+
+# =========================================================
+# SESSION STORE
+# =========================================================
+def new_game_state(target=DEFAULT_TARGET):
     return {
-        "model_ready": model_ready,
-        "question_count": game_state["question_count"],
-        "max_questions": MAX_QUESTIONS,
-        "game_over": game_state["game_over"],
-        "guessed_correctly": game_state["guessed_correctly"],
+        "target": target,
+        "question_count": 0,
+        "game_over": False,
+        "guessed_correctly": False,
     }
 
 
-@app.post("/api/game/ask")
-def ask_question(req: QuestionRequest):
-    if not model_ready:
-        raise HTTPException(status_code=503, detail="Model is still loading. Please wait...")
+class SessionStore:
+    """Game-state operations the endpoints need, each one atomic.
 
-    if game_state["game_over"]:
-        return {
-            "label": "game_over",
-            "response": "Game is already over!",
-            "question_count": game_state["question_count"],
-            "max_questions": MAX_QUESTIONS,
-            "game_over": True,
-            "guessed_correctly": game_state["guessed_correctly"],
-        }
+    - `snapshot(id)`: current state.
+    - `advance(id, max_questions)`: count one question unless the game is
+      over, ending it once the budget is exceeded. Returns (state, counted).
+    - `refund(id)`: uncount a question `advance` counted but that could not
+      be answered (e.g. shed by admission control).
+    - `mark_guessed(id)`: end the game as won unless it is already over.
+      Returns (state, changed).
+    - `reset(id, target=None)`: fresh game, on a new target if given.
+    - `create(target=None)`, `stats()`.
 
-    # Check if user is guessing directly
-    user_text = req.question.strip().lower().rstrip("?!.")
-    if user_text in ["rose", "a rose", "the rose", "is it rose", "is it a rose", "its a rose", "it's a rose", "i think it's a rose", "i think it is a rose", "the answer is rose"]:
-        game_state["guessed_correctly"] = True
-        game_state["game_over"] = True
+    Unknown or expired ids behave as a fresh game. Only `advance` and
+    `mark_guessed` (and `reset` with a target) store anything, so reads
+    such as status polls never allocate or evict a session.
+    """
+
+    async def snapshot(self, session_id):
+        raise NotImplementedError
+
+    async def advance(self, session_id, max_questions):
+        raise NotImplementedError
+
+    async def refund(self, session_id):
+        raise NotImplementedError
+
+    async def mark_guessed(self, session_id):
+        raise NotImplementedError
+
+    async def reset(self, session_id, target=None):
+        raise NotImplementedError
+
+    async def create(self, target=None):
+        session_id = uuid.uuid4().hex
+        await self.reset(session_id, target)
+        return session_id
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """In-process game sessions, sharded by id hash with one lock per shard.
+
+    Each shard is an OrderedDict kept in last-access order, so TTL expiry
+    and LRU eviction only ever look at the front of the dict: every
+    operation is O(1) amortized regardless of how many games are live.
+    """
+
+    def __init__(self, shards=SESSION_SHARDS, ttl=SESSION_TTL_SECONDS,
+                 max_entries=SESSION_MAX_ENTRIES):
+        self.ttl = ttl
+        self.shard_capacity = max(1, -(-max_entries // shards))
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self.evictions = 0
+        self.expirations = 0
+
+    def _index(self, session_id):
+        return zlib.crc32(session_id.encode()) % len(self._shards)
+
+    def _prune(self, shard, now):
+        # Entries are ordered by last access: stop at the first live one.
+        while shard:
+            sid, entry = next(iter(shard.items()))
+            if now - entry["touched"] <= self.ttl:
+                break
+            shard.popitem(last=False)
+            self.expirations += 1
+        while len(shard) > self.shard_capacity:
+            shard.popitem(last=False)
+            self.evictions += 1
+
+    @contextmanager
+    def _session(self, session_id, create=True):
+        """Yield the mutable state for `session_id` under its shard lock.
+        An unknown or expired id gets a fresh game, or None with
+        create=False, in which case nothing is stored."""
+        i = self._index(session_id)
+        shard = self._shards[i]
+        with self._locks[i]:
+            now = time.monotonic()
+            entry = shard.get(session_id)
+            if entry is not None and now - entry["touched"] > self.ttl:
+                del shard[session_id]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                if not create:
+                    yield None
+                    return
+                entry = {"touched": now, "state": new_game_state()}
+                shard[session_id] = entry
+            else:
+                entry["touched"] = now
+                shard.move_to_end(session_id)
+            self._prune(shard, now)
+            yield entry["state"]
+
+    async def snapshot(self, session_id):
+        with self._session(session_id, create=False) as state:
+            return dict(state) if state is not None else new_game_state()
+
+    async def advance(self, session_id, max_questions):
+        with self._session(session_id) as state:
+            if state["game_over"]:
+                return dict(state), False
+            state["question_count"] += 1
+            if state["question_count"] > max_questions:
+                state["game_over"] = True
+            return dict(state), True
+
+    async def refund(self, session_id):
+        with self._session(session_id, create=False) as state:
+            if state is not None and state["question_count"] > 0:
+                state["question_count"] -= 1
+
+    async def mark_guessed(self, session_id):
+        with self._session(session_id) as state:
+            if state["game_over"]:
+                return dict(state), False
+            state["guessed_correctly"] = True
+            state["game_over"] = True
+            return dict(state), True
+
+    async def reset(self, session_id, target=None):
+        # An unknown id already is a fresh game on DEFAULT_TARGET.
+        with self._session(session_id, create=target is not None) as state:
+            if state is not None:
+                state.update(new_game_state(target or state["target"]))
+
+    def stats(self):
         return {
-            "label": "guessed",
-            "response": "YES! You guessed it! The answer is ROSE!",
-            "question_count": game_state["question_count"],
-            "max_questions": MAX_QUESTIONS,
-            "game_over": True,
-            "guessed_correctly": True,
+            "backend": "memory",
+            "sessions": sum(len(s) for s in self._shards),
+            "shards": len(self._shards),
+            "max_entries": self.shard_capacity * len(self._shards),
+            "ttl_seconds": self.ttl,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
         }
 
-    game_state["question_count"] += 1
 
-    if game_state["question_count"] > MAX_QUESTIONS:
-        game_state["game_over"] = True
+# Each script reads, conditionally updates and refreshes the TTL of one
+# game hash atomically, so every operation is a single round-trip.
+REDIS_ADVANCE = """
+local s = redis.call('HMGET', KEYS[1], 'q', 'over', 'guessed', 't')
+local q = tonumber(s[1]) or 0
+local over, guessed, counted = s[2] == '1', s[3] == '1', 0
+if not over then
+  q = redis.call('HINCRBY', KEYS[1], 'q', 1)
+  counted = 1
+  if q > tonumber(ARGV[1]) then
+    over = true
+    redis.call('HSET', KEYS[1], 'over', '1')
+  end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return {q, over and 1 or 0, guessed and 1 or 0, counted, s[4] or ''}
+"""
+
+REDIS_MARK_GUESSED = """
+local s = redis.call('HMGET', KEYS[1], 'q', 'over', 'guessed', 't')
+local q = tonumber(s[1]) or 0
+if s[2] == '1' then
+  redis.call('EXPIRE', KEYS[1], ARGV[1])
+  return {q, 1, s[3] == '1' and 1 or 0, 0, s[4] or ''}
+end
+redis.call('HSET', KEYS[1], 'q', q, 'over', '1', 'guessed', '1')
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return {q, 1, 1, 1, s[4] or ''}
+"""
+
+
+REDIS_REFUND = """
+if tonumber(redis.call('HGET', KEYS[1], 'q') or 0) > 0 then
+  redis.call('HINCRBY', KEYS[1], 'q', -1)
+end
+return 0
+"""
+
+REDIS_RESET = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  return 0
+end
+redis.call('HSET', KEYS[1], 'q', 0, 'over', 0, 'guessed', 0)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class RedisSessionStore(SessionStore):
+    """Game sessions in Redis (or anything speaking its protocol), shared by
+    every replica. One hash per game with a sliding TTL; `question_count`
+    is bumped with HINCRBY inside a server-side script."""
+
+    def __init__(self, url=REDIS_URL, ttl=SESSION_TTL_SECONDS, prefix=REDIS_KEY_PREFIX,
+                 client=None):
+        if client is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError as e:
+                raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package") from e
+            client = aioredis.from_url(url, decode_responses=True)
+        self.client = client
+        self.ttl = max(1, int(ttl))
+        self.prefix = prefix
+        self._advance = client.register_script(REDIS_ADVANCE)
+        self._mark_guessed = client.register_script(REDIS_MARK_GUESSED)
+        self._refund = client.register_script(REDIS_REFUND)
+        self._reset = client.register_script(REDIS_RESET)
+
+    def _key(self, session_id):
+        return self.prefix + session_id
+
+    @staticmethod
+    def _state(q, over, guessed, target=None):
         return {
-            "label": "game_over",
-            "response": "20 questions used! The answer was ROSE!",
-            "question_count": game_state["question_count"],
-            "max_questions": MAX_QUESTIONS,
-            "game_over": True,
-            "guessed_correctly": False,
+            "target": target or DEFAULT_TARGET,
+            "question_count": int(q or 0),
+            "game_over": str(over) == "1",
+            "guessed_correctly": str(guessed) == "1",
         }
 
-    normalized = normalize_question(req.question)
-    emb = encoder.encode(normalized, convert_to_tensor=True)
+    async def snapshot(self, session_id):
+        key = self._key(session_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hmget(key, "q", "over", "guessed", "t")
+        pipe.expire(key, self.ttl)
+        values, _ = await pipe.execute()
+        return self._state(*values)
 
-    with torch.no_grad():
-        pred = torch.argmax(model(emb)).item()
+    async def advance(self, session_id, max_questions):
+        q, over, guessed, counted, target = await self._advance(
+            keys=[self._key(session_id)], args=[max_questions, self.ttl]
+        )
+        return self._state(q, over, guessed, target), counted == 1
 
-    label = ID2LABEL[pred]
+    async def refund(self, session_id):
+        await self._refund(keys=[self._key(session_id)])
 
-    return {
-        "label": label,
-        "question_count": game_state["question_count"],
-        "max_questions": MAX_QUESTIONS,
-        "game_over": False,
-        "guessed_correctly": False,
-    }
+    async def mark_guessed(self, session_id):
+        q, over, guessed, changed, target = await self._mark_guessed(
+            keys=[self._key(session_id)], args=[self.ttl]
+        )
+        return self._state(q, over, guessed, target), changed == 1
 
+    async def reset(self, session_id, target=None):
+        key = self._key(session_id)
+        if not target:
+            await self._reset(keys=[key], args=[self.ttl])
+            return
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(key, mapping={"q": 0, "over": 0, "guessed": 0, "t": target})
+        pipe.expire(key, self.ttl)
+        await pipe.execute()
+
+    def stats(self):
+        return {"backend": "redis", "sessions": None, "ttl_seconds": self.ttl}
+
+
+def make_session_store():
+    if SESSION_BACKEND == "redis":
+        return RedisSessionStore()
+    return MemorySessionStore()
 
-@app.post("/api/game/guess")
-def make_guess(req: GuessRequest):
-    if not model_ready:
-        raise HTTPException(status_code=503, detail="Model is still loading...")
 
-    if game_state["game_over"]:
+# =========================================================
+# EMBEDDING CACHE
+# =========================================================
+class EmbeddingCache:
+    """Thread-safe LRU of encoder outputs keyed by normalized question."""
+
+    def __init__(self, capacity=EMBED_CACHE_SIZE):
+        self.capacity = capacity
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            emb = self._data.get(key)
+            if emb is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return emb
+
+    def put(self, key, emb):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._data[key] = emb
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
         return {
-            "correct": game_state["guessed_correctly"],
-            "message": "Game is already over!",
-            "question_count": game_state["question_count"],
-            "game_over": True,
+            "size": len(self._data),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
         }
 
-    guess = req.guess.strip().lower()
-    if guess in ["rose", "a rose", "the rose"]:
-        game_state["guessed_correctly"] = True
-        game_state["game_over"] = True
+
+# =========================================================
+# INFERENCE BATCHER
+# =========================================================
+class InferenceBatcher:
+    """Collects concurrent encode+classify requests into one batched call.
+
+    Request threads call `submit(text)` and block on the returned Future.
+    A single worker thread waits for the first pending item, keeps
+    gathering until `max_batch` items or `max_wait_ms` have passed, then
+    runs one `encoder.encode` over the unique texts and one classifier
+    forward pass, and resolves every Future with its own label.
+    """
+
+    def __init__(self, max_batch=INFER_MAX_BATCH, max_wait_ms=INFER_MAX_WAIT_MS):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.batch_size_counts = {}
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def submit(self, text, deadline=None):
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((text, fut, deadline))
+        return fut
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _live(self, batch):
+        """Drop items whose caller gave up (cancelled Future) or whose
+        deadline passed while they sat in the queue."""
+        now = time.monotonic()
+        live = []
+        for text, fut, deadline in batch:
+            if not fut.set_running_or_notify_cancel():
+                continue
+            if deadline is not None and now > deadline:
+                fut.set_exception(DeadlineExceeded())
+            else:
+                live.append((text, fut))
+        return live
+
+    def _run(self):
+        while True:
+            batch = self._live(self._collect())
+            if not batch:
+                continue
+            try:
+                labels = classify_batch([text for text, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), label in zip(batch, labels):
+                fut.set_result(label)
+            self._record(len(batch))
+
+    def _record(self, size):
+        self.batches += 1
+        self.items += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        self.batch_size_counts[size] = self.batch_size_counts.get(size, 0) + 1
+
+    def stats(self):
         return {
-            "correct": True,
-            "message": "YES! You guessed it correctly. The answer is ROSE!",
-            "question_count": game_state["question_count"],
-            "game_over": True,
+            "enabled": INFER_BATCHING,
+            "queue_depth": self._queue.qsize(),
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 3) if self.batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
         }
-    else:
-        game_state["question_count"] += 1
-        if game_state["question_count"] > MAX_QUESTIONS:
-            game_state["game_over"] = True
+
+
+# =========================================================
+# ADMISSION CONTROL
+# =========================================================
+class DeadlineExceeded(Exception):
+    pass
+
+
+class AdmissionController:
+    """Caps how many questions may be in inference at once.
+
+    `admit()` fails fast with 429 when the cap is reached instead of letting
+    the batcher queue and executor backlog grow without bound; admitted
+    requests get a deadline, after which the work is dropped wherever it is
+    waiting and the caller gets 503. Both carry Retry-After.
+    """
+
+    def __init__(self, limit=INFER_QUEUE_LIMIT, deadline_ms=INFER_DEADLINE_MS):
+        self.limit = max(1, limit)
+        self.budget = deadline_ms / 1000.0
+        self.in_flight = 0
+        self.admitted = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                full = True
+            else:
+                full = False
+                self.in_flight += 1
+                self.admitted += 1
+        if full:
+            SHED.inc("queue_full")
+            raise overloaded(429, "Too many questions in flight, please retry shortly.")
+        try:
+            yield time.monotonic() + self.budget
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self):
+        shed = {labels[0]: n for labels, n in dict(SHED.values).items()}
         return {
-            "correct": False,
-            "message": f"Nope, it's not '{guess}'!",
-            "question_count": game_state["question_count"],
-            "game_over": game_state["game_over"],
+            "in_flight": self.in_flight,
+            "limit": self.limit,
+            "deadline_ms": self.budget * 1000.0,
+            "admitted": self.admitted,
+            "shed": shed,
         }
 
 
-@app.post("/api/game/reset")
-def reset_game():
-    game_state["question_count"] = 0
-    game_state["game_over"] = False
-    game_state["guessed_correctly"] = False
-    return {"message": "Game reset successfully", "status": "ok"}
+def overloaded(status_code, detail):
+    return HTTPException(status_code=status_code, detail=detail,
+                         headers={"Retry-After": str(SHED_RETRY_AFTER)})
+
+
+def run_before_deadline(deadline, fn, *args):
+    """Executor-side guard: skip work whose caller has already timed out."""
+    if time.monotonic() > deadline:
+        raise DeadlineExceeded()
+    return fn(*args)
+
+
+# =========================================================
+# GLOBAL STATE
+# =========================================================
+encoder = None
+model = None
+model_ready = False
+
+sessions = make_session_store()
+embedding_cache = EmbeddingCache()
+batcher = InferenceBatcher()
+admission = AdmissionController()
+
+
+def make_inference_executor():
+    return ThreadPoolExecutor(max_workers=max(1, INFERENCE_WORKERS), thread_name_prefix="inference")
+
+
+def make_bulk_executor():
+    return ThreadPoolExecutor(max_workers=max(1, CLASSIFY_WORKERS), thread_name_prefix="bulk")
+
+
+inference_executor = make_inference_executor()
+bulk_executor = make_bulk_executor()
+
+
+def reset_threads_after_fork():
+    """Threads do not survive fork. A worker forked from a preloaded master
+    gets its own executor and batcher thread; the inherited ones believe
+    they have idle workers that only exist in the master."""
+    global inference_executor, bulk_executor
+    inference_executor = make_inference_executor()
+    bulk_executor = make_bulk_executor()
+    batcher._thread = None
+    batcher._start_lock = threading.Lock()
+    if PRELOAD_MODEL:
+        torch.set_num_threads(WORKER_NUM_THREADS)
+
+
+os.register_at_fork(after_in_child=reset_threads_after_fork)
+
+# A child forked after its parent ran an intra-op parallel op hangs on its
+# first one (the OpenMP pool does not survive fork), so a preloading master
+# does all its torch work on one thread and workers get theirs after fork.
+WORKER_NUM_THREADS = TORCH_NUM_THREADS if TORCH_NUM_THREADS > 0 else torch.get_num_threads()
+if PRELOAD_MODEL:
+    torch.set_num_threads(1)
+elif TORCH_NUM_THREADS > 0:
+    torch.set_num_threads(TORCH_NUM_THREADS)
+
+
+def classify_batch(texts):
+    """Encode the unique texts in one call and classify them in one pass."""
+    unique = list(dict.fromkeys(texts))
+    with ENCODE_SECONDS.time():
+        embs = encoder.encode(unique, convert_to_tensor=True)
+    # Rows of `embs` are views that would pin the whole batch tensor for
+    # as long as any one of them stays cached.
+    for text, emb in zip(unique, embs):
+        embedding_cache.put(text, emb.clone())
+    with CLASSIFY_SECONDS.time(), torch.no_grad():
+        preds = torch.argmax(model(embs), dim=-1).tolist()
+    by_text = dict(zip(unique, preds))
+    return [ID2LABEL[by_text[t]] for t in texts]
+
+
+def classify_embedding(emb):
+    with CLASSIFY_SECONDS.time(), torch.no_grad():
+        pred = torch.argmax(model(emb)).item()
+    return ID2LABEL[pred]
+
+
+def encode_and_classify(normalized):
+    with ENCODE_SECONDS.time():
+        emb = encoder.encode(normalized, convert_to_tensor=True)
+    embedding_cache.put(normalized, emb)
+    return classify_embedding(emb)
+
+
+def classify_for_head(normalized, head):
+    """Answer `normalized` for a puzzle head, reusing the shared encoder
+    and embedding cache."""
+    emb = embedding_cache.get(normalized)
+    if emb is None:
+        with ENCODE_SECONDS.time():
+            emb = encoder.encode(normalized, convert_to_tensor=True)
+        embedding_cache.put(normalized, emb)
+    with CLASSIFY_SECONDS.time(), torch.no_grad():
+        pred = torch.argmax(head.predict(emb)[0]).item()
+    return ID2LABEL[pred]
+
+
+async def predict_label_async(normalized, is_disconnected=None, head=None):
+    """Answer `normalized` without blocking the event loop: batched
+    requests await the batcher's Future, everything else runs on the
+    dedicated inference executor. With a puzzle `head`, answers for that
+    target instead of the default classifier.
+
+    Runs under admission control: raises 429 when inference is saturated
+    and 503 once the deadline passes, cancelling the queued work so it is
+    never run. `is_disconnected` (an async callable) lets the wait end
+    early when the HTTP client has gone away.
+    """
+    with admission.admit() as deadline:
+        loop = asyncio.get_running_loop()
+        emb = embedding_cache.get(normalized) if head is None else None
+        if head is not None:
+            fut = loop.run_in_executor(inference_executor, run_before_deadline, deadline,
+                                       classify_for_head, normalized, head)
+        elif emb is None and INFER_BATCHING:
+            fut = asyncio.wrap_future(batcher.submit(normalized, deadline))
+        else:
+            fn, arg = (encode_and_classify, normalized) if emb is None else (classify_embedding, emb)
+            fut = loop.run_in_executor(inference_executor, run_before_deadline, deadline, fn, arg)
+        try:
+            return await wait_for_inference(fut, deadline, is_disconnected)
+        except DeadlineExceeded:
+            SHED.inc("deadline")
+            raise overloaded(503, "Inference is overloaded, please retry shortly.")
+
+
+async def wait_for_inference(fut, deadline, is_disconnected):
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            fut.cancel()
+            raise DeadlineExceeded()
+        # Poll for disconnects at most every 100ms; without a callable the
+        # wait is a single timeout.
+        step = min(remaining, 0.1) if is_disconnected is not None else remaining
+        done, _ = await asyncio.wait({fut}, timeout=step)
+        if done:
+            return fut.result()
+        if is_disconnected is not None and await is_disconnected():
+            fut.cancel()
+            SHED.inc("disconnected")
+            raise overloaded(503, "Client disconnected.")
+
+
+def resolve_session(session_id, response):
+    """The caller's session id, echoed in the response header.
+
+    A request without one gets a fresh id rather than a game shared with
+    every other header-less client, so a header-less ask or guess plays a
+    one-question game unless the client sends the returned id back. Reads
+    of the fresh id store nothing.
+    """
+    session_id = (session_id or "").strip()[:64] or uuid.uuid4().hex
+    response.headers[SESSION_HEADER] = session_id
+    return session_id
+
+
+# =========================================================
+# DATASET GENERATION
+# =========================================================
+def generate_dataset(size=2000, seed=None):
+    data = []
+    for label, concepts in CONCEPTS.items():
+        for c in concepts:
+            for t in TEMPLATES:
+                data.append((t.format(c), LABELS[label]))
+
+    yes_id = [
+        "is it rose?", "is it a rose?",
+        "is the answer rose?", "are you thinking of rose?"
+    ]
+    no_id = [
+        "is it tulip?", "is it lotus?",
+        "is it dog?", "is it car?"
+    ]
+    for q in yes_id:
+        data.append((q, LABELS["yes"]))
+    for q in no_id:
+        data.append((q, LABELS["no"]))
+
+    (random.Random(seed) if seed is not None else random).shuffle(data)
+    return data[:size]
+
+
+# =========================================================
+# NORMALIZATION
+# =========================================================
+def canonical_question(q):
+    return " ".join(q.lower().split()).rstrip("?!. ")
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over literal phrases.
+
+    Each phrase carries an integer priority; `best(text)` returns the lowest
+    priority among all phrases occurring in `text` (or None) in one pass
+    over the text, so the cost tracks text length, not rule count.
+    """
+
+    def __init__(self, phrases):
+        self.goto = [{}]
+        self.best_at = [None]
+        for phrase, priority in phrases:
+            node = 0
+            for ch in phrase:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.best_at.append(None)
+                    self.goto[node][ch] = nxt
+                node = nxt
+            if self.best_at[node] is None or priority < self.best_at[node]:
+                self.best_at[node] = priority
+        self.fail = [0] * len(self.goto)
+        # Breadth-first, so a node's failure target is final before its
+        # children inherit the matches reachable through it.
+        pending = list(self.goto[0].values())
+        for node in pending:
+            for ch, nxt in self.goto[node].items():
+                pending.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                inherited = self.best_at[self.fail[nxt]]
+                if inherited is not None and (self.best_at[nxt] is None or inherited < self.best_at[nxt]):
+                    self.best_at[nxt] = inherited
+
+    def best(self, text):
+        goto, fail, best_at = self.goto, self.fail, self.best_at
+        node, found = 0, None
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = best_at[node]
+            if hit is not None and (found is None or hit < found):
+                found = hit
+        return found
+
+
+def guess_set(templates, target):
+    return frozenset(canonical_question(g.format(target=target)) for g in templates)
+
+
+class RuleEngine:
+    """NORMALIZATION_RULES and GUESS_PHRASES compiled once: rewrites into a
+    single PhraseMatcher, guesses into a set of canonical phrasings for
+    DEFAULT_TARGET (puzzle heads carry their own)."""
+
+    def __init__(self, rewrites, guesses):
+        self.targets = [rule["to"] for rule in rewrites]
+        self.matcher = PhraseMatcher(
+            (phrase.lower(), i)
+            for i, rule in enumerate(rewrites)
+            for phrase in rule["phrases"]
+        )
+        self.guess_templates = list(guesses)
+        self.guesses = guess_set(self.guess_templates, DEFAULT_TARGET)
+
+    def normalize(self, q):
+        q = q.lower().strip()
+        rule = self.matcher.best(q)
+        return q if rule is None else self.targets[rule]
+
+    def is_guess(self, text, guesses=None):
+        return canonical_question(text) in (self.guesses if guesses is None else guesses)
+
+    def stats(self):
+        return {
+            "rewrites": len(self.targets),
+            "automaton_states": len(self.matcher.goto),
+            "guess_phrases": len(self.guesses),
+        }
+
+
+def load_rules(path):
+    with open(path) as fh:
+        data = json.load(fh)
+    return RuleEngine(data.get("rewrites", NORMALIZATION_RULES),
+                      data.get("guesses", GUESS_PHRASES))
+
+
+rules = load_rules(RULES_FILE) if RULES_FILE else RuleEngine(NORMALIZATION_RULES, GUESS_PHRASES)
+
+
+def normalize_question(q):
+    return rules.normalize(q)
+
+
+# =========================================================
+# EXACT-MATCH ANSWER INDEX
+# =========================================================
+class AnswerIndex:
+    """Known questions from `generate_dataset`, keyed by canonical text.
+
+    Lookups take the output of `normalize_question`, so paraphrases folded
+    by the normalization rules hit the same entries as the dataset.
+    """
+
+    def __init__(self):
+        self.table = {
+            canonical_question(q): ID2LABEL[label]
+            for q, label in generate_dataset(size=None)
+        }
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, normalized):
+        label = self.table.get(canonical_question(normalized))
+        if label is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return label
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.table),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+answer_index = AnswerIndex() if ANSWER_INDEX_ENABLED else None
+
+
+# =========================================================
+# FALLBACK ANSWERER (used while the neural model warms up)
+# =========================================================
+def tokenize(text):
+    return re.findall(r"[a-z']+", text.lower())
+
+
+class KeywordAnswerer:
+    """IDF-weighted keyword overlap between the question and CONCEPTS.
+
+    Built from the knowledge base in a few milliseconds at import, so the
+    game can answer before the encoder has even been loaded.
+    """
+
+    def __init__(self):
+        stop = set(tokenize(" ".join(TEMPLATES))) | {"a", "an", "the"}
+        self.phrases = []
+        index = {}
+        for label, concepts in CONCEPTS.items():
+            for concept in concepts:
+                tokens = {t for t in tokenize(concept) if t not in stop}
+                if not tokens:
+                    continue
+                for t in tokens:
+                    index.setdefault(t, []).append(len(self.phrases))
+                self.phrases.append((tokens, LABELS[label]))
+        n = len(self.phrases)
+        self.idf = {t: math.log(1 + n / len(ids)) for t, ids in index.items()}
+        self.index = index
+        self.stop = stop
+
+    def answer(self, normalized):
+        scores = {}
+        for t in set(tokenize(normalized)) - self.stop:
+            for i in self.index.get(t, ()):
+                scores[i] = scores.get(i, 0.0) + self.idf[t]
+        if not scores:
+            return "i don't know"
+        best = max(
+            scores,
+            key=lambda i: (
+                scores[i] / sum(self.idf[t] for t in self.phrases[i][0]),
+                scores[i],
+            ),
+        )
+        return ID2LABEL[self.phrases[best][1]]
+
+
+fallback = KeywordAnswerer() if FALLBACK_ENABLED else None
+
+
+def current_engine():
+    if model_ready:
+        return "neural"
+    return "fallback" if fallback is not None else None
+
+
+# =========================================================
+# ARTIFACT CACHE
+# =========================================================
+def knowledge_hash():
+    """Fingerprint of everything that determines the trained classifier."""
+    payload = json.dumps(
+        {
+            "concepts": CONCEPTS,
+            "templates": TEMPLATES,
+            "labels": LABELS,
+            "model_name": MODEL_NAME,
+            "encoder_backend": ENCODER_BACKEND,
+            "embed_dim": EMBED_DIM,
+            # Training settings too, so changing any of them retrains
+            # instead of reusing a classifier fitted under the old ones.
+            "training": {
+                "mode": TRAIN_MODE,
+                "seed": TRAIN_SEED,
+                "batch_size": BATCH_SIZE,
+                "lr": LR,
+                "epochs": EPOCHS,
+                "max_epochs": TRAIN_MAX_EPOCHS,
+                "patience": TRAIN_PATIENCE,
+                "val_fraction": TRAIN_VAL_FRACTION,
+                # Fast mode refits on the full dataset after early stopping;
+                # classifiers saved before that are not reused.
+                "refit": True,
+            },
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def artifact_path(digest):
+    return os.path.join(ARTIFACT_DIR, f"rose_classifier_{digest[:16]}.pt")
+
+
+def load_artifacts(digest):
+    path = artifact_path(digest)
+    if not os.path.exists(path):
+        return None
+    try:
+        blob = torch.load(path, map_location="cpu", weights_only=True)
+    except Exception as e:
+        print(f"[ML] Ignoring unreadable artifact {path}: {e}")
+        return None
+    if blob.get("hash") != digest:
+        return None
+    return blob
+
+
+@contextmanager
+def artifact_lock():
+    """Serialize load-or-train across worker processes sharing ARTIFACT_DIR,
+    so only the first worker trains and the rest load its output."""
+    try:
+        os.makedirs(ARTIFACT_DIR, exist_ok=True)
+        fh = open(os.path.join(ARTIFACT_DIR, ".lock"), "w")
+    except OSError as e:
+        print(f"[ML] Artifact dir unavailable, training in memory: {e}")
+        yield False
+        return
+    with fh:
+        # The lock is released when the file is closed.
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        yield True
+
+
+def mmap_weights(module, path):
+    """Rebind `module`'s parameters to a read-only memory map of `path`.
+
+    The file is written from the module's current weights on first use.
+    Pages are mapped copy-on-write, and inference never writes them, so
+    every worker that maps the same file shares one physical copy.
+    """
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        torch.save(module.state_dict(), tmp)
+        os.replace(tmp, path)
+    state = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    module.load_state_dict(state, assign=True)
+
+
+def save_artifacts(digest, model_local, embeddings, labels_tensor):
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    path = artifact_path(digest)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    torch.save(
+        {
+            "hash": digest,
+            "state_dict": model_local.state_dict(),
+            "embeddings": embeddings.cpu(),
+            "labels": labels_tensor,
+        },
+        tmp,
+    )
+    os.replace(tmp, path)
+    print(f"[ML] Saved artifacts to {path}")
+
+
+# =========================================================
+# STATIC ENCODER
+# =========================================================
+class StaticEncoder:
+    """Sentence encoder backed by one precomputed vector per vocabulary token.
+
+    Each token id is run through the full sentence transformer once, as
+    `[CLS] token [SEP]`. A question is then encoded by tokenizing it and
+    mean-pooling rows of that table, with no transformer at query time.
+    `encode` mirrors SentenceTransformer.encode so it drops into every
+    existing call site and feeds RoseClassifier unchanged.
+    """
+
+    def __init__(self, tokenizer, table):
+        self.tokenizer = tokenizer
+        self.table = table
+
+    @classmethod
+    def distill(cls, st_encoder, batch_size=STATIC_DISTILL_BATCH):
+        tokenizer = st_encoder.tokenizer
+        vocab_size = len(tokenizer)
+        table = np.zeros((vocab_size, EMBED_DIM), dtype=np.float32)
+        cls_id, sep_id = tokenizer.cls_token_id, tokenizer.sep_token_id
+        print(f"[ML] Distilling {vocab_size} static token vectors...")
+        with torch.no_grad():
+            for start in range(0, vocab_size, batch_size):
+                ids = torch.arange(start, min(start + batch_size, vocab_size))
+                input_ids = torch.stack(
+                    [torch.full_like(ids, cls_id), ids, torch.full_like(ids, sep_id)], dim=1
+                )
+                features = st_encoder({
+                    "input_ids": input_ids,
+                    "attention_mask": torch.ones_like(input_ids),
+                })
+                table[start:start + len(ids)] = features["sentence_embedding"].float().numpy()
+        return cls(tokenizer, table)
+
+    def encode(self, sentences, convert_to_tensor=False, **kwargs):
+        single = isinstance(sentences, str)
+        batch = [sentences] if single else list(sentences)
+        ids = self.tokenizer(batch, add_special_tokens=False)["input_ids"]
+        lengths = np.fromiter((len(x) for x in ids), dtype=np.int64, count=len(ids))
+        flat = np.fromiter(
+            (t for x in ids for t in x), dtype=np.int64, count=int(lengths.sum())
+        )
+        out = np.zeros((len(batch), self.table.shape[1]), dtype=np.float32)
+        nonempty = lengths > 0
+        if flat.size:
+            offsets = np.cumsum(lengths) - lengths
+            sums = np.add.reduceat(self.table[flat], offsets[nonempty], axis=0)
+            out[nonempty] = sums / lengths[nonempty, None]
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            np.divide(out, norms, out=out, where=norms > 0)
+        if single:
+            out = out[0]
+        return torch.from_numpy(out) if convert_to_tensor else out
+
+    def nbytes(self):
+        return self.table.nbytes
+
+
+def load_static_encoder():
+    """Load the distilled token table from ARTIFACT_DIR, distilling it from
+    MODEL_NAME on first use. The table is memory-mapped, so workers share it."""
+    from transformers import AutoTokenizer
+
+    path = os.path.join(ARTIFACT_DIR, f"static_{MODEL_NAME.replace('/', '__')}.npy")
+    with artifact_lock() as locked:
+        if os.path.exists(path):
+            tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+            return StaticEncoder(tokenizer, np.load(path, mmap_mode="r"))
+        start = time.perf_counter()
+        static = StaticEncoder.distill(load_sentence_transformer())
+        print(f"[ML] Distilled static encoder in {time.perf_counter() - start:.1f}s")
+        if locked:
+            tmp = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp, static.table)
+            os.replace(tmp, path)
+        return static
+
+
+def load_encoder():
+    if ENCODER_BACKEND == "static":
+        print("[ML] Loading static encoder...")
+        return load_static_encoder()
+    print("[ML] Loading sentence transformer...")
+    return load_sentence_transformer()
+
+
+def load_sentence_transformer():
+    # Imported on first use: sentence_transformers drags in transformers,
+    # several seconds and a few hundred MB before the first request.
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
+
+
+# =========================================================
+# SENTENCE EMBEDDING STORE
+# =========================================================
+class SentenceEmbeddingStore:
+    """Persistent, content-addressed cache of dataset sentence embeddings.
+
+    Rows are keyed by sha256(namespace + text), where the namespace names
+    the encoder, so editing CONCEPTS or TEMPLATES only encodes the strings
+    that are new. Everything lives in one file under ARTIFACT_DIR.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = None
+        self._vectors = None
+
+    def _path(self):
+        return os.path.join(ARTIFACT_DIR, "sentence_embeddings.pt")
+
+    def _load(self):
+        if self._rows is not None:
+            return
+        self._rows, self._vectors = {}, torch.zeros(0, EMBED_DIM)
+        try:
+            blob = torch.load(self._path(), map_location="cpu", weights_only=True)
+            self._rows = {k: i for i, k in enumerate(blob["keys"])}
+            self._vectors = blob["vectors"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[ML] Ignoring unreadable embedding store: {e}")
+
+    def _save(self):
+        keys = sorted(self._rows, key=self._rows.get)
+        path = self._path()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(ARTIFACT_DIR, exist_ok=True)
+        torch.save({"keys": keys, "vectors": self._vectors}, tmp)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def key(namespace, text):
+        return hashlib.sha256(f"{namespace}\0{text}".encode()).hexdigest()
+
+    def release(self):
+        """Forget the in-memory rows; the next `encode` reloads the file."""
+        with self._lock:
+            self._rows = None
+            self._vectors = None
+
+    def encode(self, encoder_local, texts, namespace):
+        with self._lock:
+            self._load()
+            keys = [self.key(namespace, t) for t in texts]
+            missing = list(dict.fromkeys(
+                t for t, k in zip(texts, keys) if k not in self._rows
+            ))
+            if missing:
+                print(f"[ML] Encoding {len(missing)} new of {len(texts)} sentences")
+                fresh = encoder_local.encode(missing, convert_to_tensor=True).cpu()
+                base = len(self._vectors)
+                for i, t in enumerate(missing):
+                    self._rows[self.key(namespace, t)] = base + i
+                self._vectors = torch.cat([self._vectors, fresh.float()])
+                try:
+                    self._save()
+                except OSError as e:
+                    print(f"[ML] Could not save embedding store: {e}")
+            return self._vectors[[self._rows[k] for k in keys]]
+
+
+embedding_store = SentenceEmbeddingStore()
+
+
+def training_namespace():
+    """Store namespace of training embeddings, which always come from the
+    full-precision encoder (see `training_encoder`)."""
+    return MODEL_NAME + ("/static" if ENCODER_BACKEND == "static" else "")
+
+
+def encoder_namespace():
+    """Store namespace of the encoder being served, e.g. for puzzle banks."""
+    namespace = training_namespace()
+    if precision_report.get("active"):
+        namespace += "/" + INFERENCE_DTYPE
+    return namespace + ("/int8" if quantization_report.get("active") else "")
+
+
+class FullPrecisionEncoder:
+    """Stands in for the unreduced encoder once the served one has been
+    quantized or cast: loads it on the first `encode`, which the embedding
+    store only makes for sentences it has not stored yet, and drops it
+    with this object."""
+
+    def __init__(self):
+        self._encoder = None
+
+    def encode(self, *args, **kwargs):
+        if self._encoder is None:
+            print("[ML] Loading full-precision encoder for new training sentences...")
+            self._encoder = load_encoder()
+        return self._encoder.encode(*args, **kwargs)
+
+
+def training_encoder():
+    """The encoder to build training embeddings with after startup. Reloads
+    train on the same full-precision embeddings as the startup classifier,
+    and stay incremental in the store."""
+    if quantization_report.get("active") or precision_report.get("active"):
+        return FullPrecisionEncoder()
+    return encoder
+
+
+# =========================================================
+# PUZZLES (many targets, one encoder)
+# =========================================================
+def encode_concepts(encoder_local, concepts, templates):
+    """Normalized embeddings of every phrasing in `templates` of each
+    concept, concept-major (row // len(templates) is the concept)."""
+    texts = [t.format(c) for c in concepts for t in templates]
+    embs = embedding_store.encode(encoder_local, texts, encoder_namespace())
+    return nn.functional.normalize(torch.as_tensor(embs).float(), dim=-1)
+
+
+class ConceptBank:
+    """Every concept in the built-in knowledge, embedded once under every
+    template. Shared by all puzzle heads, whose labels index into it.
+
+    The templates are captured at build time, so a bank and the heads built
+    on it stay consistent while a reload swaps the knowledge underneath.
+    """
+
+    def __init__(self, encoder_local):
+        self.templates = list(TEMPLATES)
+        self.concepts = sorted({c for cs in CONCEPTS.values() for c in cs})
+        self.index = {c: i for i, c in enumerate(self.concepts)}
+        self.matrix = encode_concepts(encoder_local, self.concepts, self.templates)
+        if KNN_THRESHOLD == "auto":
+            self.threshold = calibrate_threshold(self.matrix)
+        else:
+            self.threshold = float(KNN_THRESHOLD)
+
+    def nbytes(self):
+        return self.matrix.numel() * self.matrix.element_size()
+
+
+class TargetHead:
+    """One puzzle's answers: an int8 label per bank concept (-1 where the
+    puzzle says nothing) plus fp16 rows for concepts the bank lacks.
+
+    Classification is k-NN voting over the bank rows the puzzle labels, so
+    a puzzle within the bank's vocabulary costs a few hundred bytes.
+    """
+
+    def __init__(self, target, bank, labels, extra, extra_labels, guesses):
+        self.target = target
+        self.bank = bank
+        self.labels = labels
+        self.extra = extra
+        self.extra_labels = extra_labels
+        self.guesses = guesses
+
+    @classmethod
+    def build(cls, target, spec, bank, encoder_local):
+        labels = torch.full((len(bank.concepts),), -1, dtype=torch.int8)
+        novel, novel_labels = [], []
+        for label, concepts in spec["concepts"].items():
+            for c in concepts:
+                if c in bank.index:
+                    labels[bank.index[c]] = LABELS[label]
+                else:
+                    novel.append(c)
+                    novel_labels.append(LABELS[label])
+        if novel:
+            extra = encode_concepts(encoder_local, novel, bank.templates).half()
+            extra_labels = torch.tensor(novel_labels, dtype=torch.int8).repeat_interleave(len(bank.templates))
+        else:
+            extra = torch.empty(0, bank.matrix.shape[1], dtype=torch.float16)
+            extra_labels = torch.empty(0, dtype=torch.int8)
+        guesses = guess_set(spec.get("guesses", rules.guess_templates), target)
+        return cls(target, bank, labels, extra, extra_labels, guesses)
+
+    def nbytes(self):
+        return (self.labels.numel() + self.extra_labels.numel()
+                + self.extra.numel() * self.extra.element_size()
+                + sum(len(g) for g in self.guesses))
+
+    def predict(self, embs):
+        bank = self.bank
+        x = nn.functional.normalize(embs.float().reshape(-1, bank.matrix.shape[1]), dim=-1)
+        row_labels = self.labels.long().repeat_interleave(len(bank.templates))
+        # Rows this puzzle does not label can never outvote one it does.
+        sims = (x @ bank.matrix.T).masked_fill(row_labels < 0, -1.0)
+        if len(self.extra):
+            sims = torch.cat([sims, x @ self.extra.float().T], dim=1)
+            row_labels = torch.cat([row_labels, self.extra_labels.long()])
+        return knn_votes(sims, row_labels.clamp(min=0), KNN_K, bank.threshold)
+
+
+class PuzzleRegistry:
+    """Targets sessions can play. DEFAULT_TARGET is served by the trained
+    classifier; the others are TargetHeads read from PUZZLES_DIR on first
+    use and kept in an LRU bounded by `budget` bytes, so memory follows
+    the targets being played rather than the number on disk."""
+
+    def __init__(self, directory=PUZZLES_DIR, budget=PUZZLE_HEAD_BUDGET_BYTES):
+        self.directory = directory
+        self.budget = budget
+        self._bank = None
+        self._heads = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def _path(self, target):
+        if not self.directory or not re.fullmatch(r"[a-z0-9][a-z0-9 _-]*", target):
+            return None
+        return os.path.join(self.directory, f"{target}.json")
+
+    def exists(self, target):
+        if target == DEFAULT_TARGET:
+            return True
+        path = self._path(target)
+        return path is not None and os.path.isfile(path)
+
+    def targets(self):
+        names = [DEFAULT_TARGET]
+        if self.directory and os.path.isdir(self.directory):
+            names += sorted(f[:-5] for f in os.listdir(self.directory)
+                            if f.endswith(".json") and f[:-5] != DEFAULT_TARGET)
+        return names
+
+    def bank(self):
+        with self._lock:
+            if self._bank is None:
+                self._bank = ConceptBank(encoder)
+                print(f"[ML] Concept bank: {len(self._bank.concepts)} concepts, "
+                      f"{self._bank.nbytes()} bytes")
+                # Building it loaded the whole embedding store.
+                if RELEASE_TRAINING_MEMORY:
+                    release_training_memory()
+            return self._bank
+
+    def head(self, target):
+        """The head for `target`, loading it if needed. Raises KeyError for
+        an unknown target and ValueError for a malformed puzzle file."""
+        with self._lock:
+            head = self._heads.get(target)
+            if head is not None:
+                self._heads.move_to_end(target)
+                return head
+        path = self._path(target)
+        if path is None or not os.path.isfile(path):
+            raise KeyError(target)
+        with open(path) as fh:
+            spec = json.load(fh)
+        check_puzzle(spec, path)
+        head = TargetHead.build(target, spec, self.bank(), encoder)
+        if len(head.extra) and RELEASE_TRAINING_MEMORY:
+            embedding_store.release()
+        with self._lock:
+            # A head built on a bank invalidated meanwhile is served once
+            # but not cached.
+            if head.bank is not self._bank:
+                return head
+            if target not in self._heads:
+                self._heads[target] = head
+                self._bytes += head.nbytes()
+                self.loads += 1
+            # Keep at least the head just loaded, whatever the budget.
+            while self._bytes > self.budget and len(self._heads) > 1:
+                _, evicted = self._heads.popitem(last=False)
+                self._bytes -= evicted.nbytes()
+                self.evictions += 1
+            return self._heads.get(target, head)
+
+    def invalidate(self, update=None):
+        """Drop the bank and every head, e.g. after the knowledge changed.
+        `update`, if given, runs under the same lock, so no bank is built
+        from half-swapped knowledge."""
+        with self._lock:
+            if update is not None:
+                update()
+            self._bank = None
+            self._heads.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "default": DEFAULT_TARGET,
+                "available": len(self.targets()),
+                "loaded": list(self._heads),
+                "head_bytes": self._bytes,
+                "budget_bytes": self.budget,
+                "bank_bytes": self._bank.nbytes() if self._bank is not None else 0,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+puzzles = PuzzleRegistry()
+
+
+# =========================================================
+# QUANTIZATION
+# =========================================================
+quantization_report = {"enabled": INFERENCE_QUANTIZE}
+
+
+def quantize_module(module):
+    if not isinstance(module, nn.Module):
+        return module
+    return torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8)
+
+
+def dataset_predictions(encoder_local, model_local, texts):
+    start = time.perf_counter()
+    embs = encoder_local.encode(texts, convert_to_tensor=True)
+    with torch.no_grad():
+        preds = torch.argmax(model_local(embs), dim=-1)
+    return preds, time.perf_counter() - start
+
+
+def convert_if_agreeing(encoder_local, model_local, convert, name, report):
+    """Return `convert`ed copies of the encoder and classifier, or the fp32
+    originals if the converted labels on the generated dataset agree less
+    than QUANTIZE_MIN_AGREEMENT of the time. Timings go into `report`."""
+    texts = [q for q, _ in generate_dataset(size=None)]
+    c_encoder = convert(encoder_local)
+    c_model = convert(model_local)
+
+    ref, fp32_seconds = dataset_predictions(encoder_local, model_local, texts)
+    got, seconds = dataset_predictions(c_encoder, c_model, texts)
+    agreement = (ref == got).float().mean().item()
+    accepted = agreement >= QUANTIZE_MIN_AGREEMENT
+    report.update({
+        "agreement": round(agreement, 4),
+        "min_agreement": QUANTIZE_MIN_AGREEMENT,
+        "fp32_seconds": round(fp32_seconds, 4),
+        f"{name}_seconds": round(seconds, 4),
+        "speedup": round(fp32_seconds / seconds, 2) if seconds else None,
+        "active": accepted,
+    })
+    print(f"[ML] {name} agreement {agreement:.2%} over {len(texts)} questions, "
+          f"speedup {report['speedup']}x")
+    if not accepted:
+        print(f"[ML] {name} labels disagree with fp32, keeping fp32 weights")
+        return encoder_local, model_local
+    return c_encoder, c_model
+
+
+def quantize_for_inference(encoder_local, model_local):
+    return convert_if_agreeing(encoder_local, model_local, quantize_module, "int8",
+                               quantization_report)
+
+
+precision_report = {"requested": INFERENCE_DTYPE}
+
+
+def to_dtype(module, dtype):
+    if not isinstance(module, nn.Module):
+        return module
+    module = copy.deepcopy(module).to(dtype)
+    if isinstance(module, RoseClassifier):
+        module.dtype = dtype
+    return module
+
+
+def reduce_precision(encoder_local, model_local):
+    dtype = getattr(torch, INFERENCE_DTYPE)
+    return convert_if_agreeing(encoder_local, model_local, lambda m: to_dtype(m, dtype),
+                               INFERENCE_DTYPE, precision_report)
+
+
+def release_training_memory():
+    """Drop what only training needed and return freed heap to the OS;
+    without malloc_trim glibc keeps it and RSS never comes down."""
+    embedding_store.release()
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+# =========================================================
+# COMPILED INFERENCE
+# =========================================================
+compile_report = {"mode": INFERENCE_COMPILE, "warmup": INFERENCE_WARMUP}
+
+
+def allow_recompiles(shapes):
+    """torch.compile falls back to eager after a few recompiles of one
+    function (8 by default); every bucket shape needs its own graph."""
+    config = torch._dynamo.config
+    name = "recompile_limit" if hasattr(config, "recompile_limit") else "cache_size_limit"
+    setattr(config, name, max(getattr(config, name), shapes))
+
+
+def bucket(n, buckets):
+    """Smallest bucket holding `n`, or `n` itself past the largest."""
+    i = bisect.bisect_left(buckets, n)
+    return buckets[i] if i < len(buckets) else n
+
+
+class BucketedClassifier(nn.Module):
+    """A RoseClassifier served from a traced or compiled graph.
+
+    Batches are padded up to the next INFER_BATCH_BUCKETS size (and split
+    at the largest), so the graph only ever sees those shapes and warm-up
+    can visit all of them ahead of time.
+    """
+
+    def __init__(self, inner, mode):
+        super().__init__()
+        self.inner = inner
+        if mode == "trace":
+            self.graph = torch.jit.trace(inner, torch.zeros(INFER_BATCH_BUCKETS[0], EMBED_DIM))
+        else:
+            allow_recompiles(len(INFER_BATCH_BUCKETS))
+            self.graph = torch.compile(inner, dynamic=False)
+
+    def forward(self, x):
+        squeeze = x.dim() == 1
+        x = x.reshape(-1, EMBED_DIM)
+        if not len(x):
+            return self.inner(x)
+        step = INFER_BATCH_BUCKETS[-1]
+        outs = []
+        for i in range(0, len(x), step):
+            chunk = x[i:i + step]
+            n = len(chunk)
+            rows = bucket(n, INFER_BATCH_BUCKETS)
+            if rows > n:
+                chunk = torch.cat([chunk, chunk[:1].expand(rows - n, -1)])
+            outs.append(self.graph(chunk)[:n])
+        out = torch.cat(outs)
+        return out[0] if squeeze else out
+
+
+class BucketedEncoder:
+    """A SentenceTransformer whose forward pass is compiled and always sees
+    a (batch, sequence) bucket shape.
+
+    Tokenized batches are padded with masked positions (which mean pooling
+    ignores) and filler rows (dropped afterwards). `encode` mirrors
+    SentenceTransformer.encode so it drops into every inference path.
+    """
+
+    def __init__(self, module):
+        self.module = module
+        max_len = module.max_seq_length
+        self.seq_buckets = tuple(sorted({b for b in INFER_SEQ_BUCKETS if b < max_len} | {max_len}))
+        allow_recompiles(len(INFER_BATCH_BUCKETS) * len(self.seq_buckets))
+        self.graph = torch.compile(module, dynamic=False)
+
+    def encode(self, sentences, convert_to_tensor=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        step = INFER_BATCH_BUCKETS[-1]
+        chunks = [self._encode_batch(texts[i:i + step]) for i in range(0, len(texts), step)]
+        out = torch.cat(chunks) if chunks else torch.zeros(0, EMBED_DIM)
+        if single:
+            out = out[0]
+        return out if convert_to_tensor else out.float().numpy()
+
+    def _encode_batch(self, texts):
+        features = self.module.tokenize(texts)
+        n, length = features["input_ids"].shape
+        rows = bucket(n, INFER_BATCH_BUCKETS)
+        cols = bucket(length, self.seq_buckets)
+        padded = {}
+        for key, value in features.items():
+            grid = torch.zeros(rows, cols, dtype=value.dtype)
+            grid[:n, :length] = value
+            grid[n:] = grid[0]
+            padded[key] = grid.to(self.module.device)
+        with torch.no_grad():
+            emb = self.graph(padded)["sentence_embedding"]
+        return emb[:n].cpu()
+
+
+def compile_classifier(model_local):
+    if not isinstance(model_local, RoseClassifier):
+        return model_local
+    return BucketedClassifier(model_local, INFERENCE_COMPILE)
+
+
+def compile_for_inference(encoder_local, model_local):
+    """Wrap the classifier (and, with torch.compile, a transformer encoder)
+    in bucketed graphs; k-NN and static encoders stay as they are."""
+    model_local = compile_classifier(model_local)
+    if INFERENCE_COMPILE == "compile" and isinstance(encoder_local, nn.Module) \
+            and hasattr(encoder_local, "tokenize"):
+        encoder_local = BucketedEncoder(encoder_local)
+    compile_report.update({
+        "classifier": type(model_local).__name__,
+        "encoder": type(encoder_local).__name__,
+    })
+    return encoder_local, model_local
+
+
+def warmup_texts(encoder_local):
+    """One synthetic question per sequence bucket the encoder pads to."""
+    lengths = getattr(encoder_local, "seq_buckets", (8,))
+    # Roughly one token per word, less room for [CLS]/[SEP].
+    return [("is it " + " ".join(["flower"] * max(1, n - 6)) + "?") for n in lengths]
+
+
+def warm_up(encoder_local, model_local):
+    """Run synthetic encode+classify passes over every batch and sequence
+    bucket so tokenizer setup, kernel selection, graph compilation and
+    allocator growth are paid before readiness, not by the first player.
+
+    Returns the (encoder, classifier) to serve: the eager originals if a
+    compiled graph fails here.
+    """
+    def once(texts):
+        start = time.perf_counter()
+        embs = encoder_local.encode(texts, convert_to_tensor=True)
+        with torch.no_grad():
+            model_local(embs)
+        return (time.perf_counter() - start) * 1000.0
+
+    try:
+        first_ms = once(["is it a flower?"])
+        for text in warmup_texts(encoder_local):
+            for size in INFER_BATCH_BUCKETS:
+                once([text] * size)
+        # Spin up the executor's threads too, each with one question. Not
+        # when preloading for a pre-fork server: the threads would stay in
+        # the master.
+        if not PRELOAD_MODEL:
+            workers = max(1, INFERENCE_WORKERS)
+            for fut in [inference_executor.submit(once, ["is it red?"]) for _ in range(workers)]:
+                fut.result()
+        steady_ms = min(once(["is it a flower?"]) for _ in range(5))
+    except Exception as e:
+        if not isinstance(model_local, BucketedClassifier) and not isinstance(encoder_local, BucketedEncoder):
+            raise
+        print(f"[ML] Compiled inference failed warm-up ({e}), serving eager")
+        compile_report["error"] = str(e)
+        encoder_local = getattr(encoder_local, "module", encoder_local)
+        model_local = getattr(model_local, "inner", model_local)
+        return warm_up(encoder_local, model_local)
+    compile_report.update({"first_call_ms": round(first_ms, 3), "steady_call_ms": round(steady_ms, 3)})
+    print(f"[ML] Warm-up: first call {first_ms:.1f}ms, steady {steady_ms:.1f}ms")
+    return encoder_local, model_local
+
+
+# =========================================================
+# TRAINING FUNCTION (runs in background thread)
+# =========================================================
+def encode_dataset(encoder_local):
+    print("[ML] Generating dataset...")
+    dataset = generate_dataset(seed=TRAIN_SEED)
+    print(f"[ML] Samples: {len(dataset)}")
+
+    texts, labels = zip(*dataset)
+    print("[ML] Encoding texts...")
+    embeddings = embedding_store.encode(encoder_local, list(texts), training_namespace())
+    return embeddings, torch.tensor(labels)
+
+
+def fit_classifier(embeddings, labels_tensor, on_epoch=None):
+    """Train a RoseClassifier. `on_epoch(epoch, loss, seconds)` is called
+    after every epoch if given."""
+    from torch.utils.data import DataLoader, TensorDataset
+    start = time.perf_counter()
+    model_local = RoseClassifier()
+
+    loader = DataLoader(
+        TensorDataset(embeddings, labels_tensor),
+        batch_size=BATCH_SIZE,
+        shuffle=True
+    )
+    optimizer = torch.optim.Adam(model_local.parameters(), lr=LR)
+    loss_fn = nn.CrossEntropyLoss()
+
+    print("[ML] Training...")
+    for epoch in range(EPOCHS):
+        total = 0
+        epoch_start = time.perf_counter()
+        for x, y in loader:
+            optimizer.zero_grad()
+            loss = loss_fn(model_local(x), y)
+            loss.backward()
+            optimizer.step()
+            total += loss.item()
+        if on_epoch is not None:
+            on_epoch(epoch + 1, total, time.perf_counter() - epoch_start)
+        if (epoch + 1) % 5 == 0:
+            print(f"[ML] Epoch {epoch+1}/{EPOCHS} | Loss: {total:.4f}")
+
+    training_report.update({
+        "mode": "dataloader",
+        "epochs_run": EPOCHS,
+        "train_accuracy": accuracy(model_local, embeddings, labels_tensor),
+        "wall_seconds": round(time.perf_counter() - start, 4),
+    })
+    return model_local
+
+
+def accuracy(model_local, x, y):
+    if len(y) == 0:
+        return None
+    with torch.no_grad():
+        return (torch.argmax(model_local(x), dim=-1) == y).float().mean().item()
+
+
+def fit_classifier_fast(embeddings, labels_tensor, on_epoch=None, seed=TRAIN_SEED):
+    """Train a RoseClassifier without a DataLoader.
+
+    The dataset stays in two preallocated tensors and each epoch is an
+    index permutation from a seeded generator. A seeded validation split
+    picks the epoch count by early stopping (no improvement in validation
+    loss for TRAIN_PATIENCE epochs); the model is then refitted on the
+    whole dataset for that many epochs, since every row of the hand-written
+    knowledge base is a phrasing the classifier must know.
+    """
+    start = time.perf_counter()
+    x_all = embeddings.detach().float().contiguous()
+    y_all = labels_tensor.long()
+    gen = torch.Generator().manual_seed(seed)
+    loss_fn = nn.CrossEntropyLoss()
+
+    def fresh_model():
+        with torch.random.fork_rng():
+            torch.manual_seed(seed)
+            model_local = RoseClassifier()
+        return model_local, torch.optim.Adam(model_local.parameters(), lr=LR)
+
+    epochs_run = 0
+
+    def run_epoch(model_local, optimizer, x, y):
+        # `on_epoch` numbers the search and refit epochs consecutively.
+        nonlocal epochs_run
+        epochs_run += 1
+        epoch_start = time.perf_counter()
+        model_local.train()
+        order = torch.randperm(len(y), generator=gen)
+        total = 0.0
+        for i in range(0, len(order), BATCH_SIZE):
+            b = order[i:i + BATCH_SIZE]
+            optimizer.zero_grad()
+            loss = loss_fn(model_local(x[b]), y[b])
+            loss.backward()
+            optimizer.step()
+            total += loss.item()
+        if on_epoch is not None:
+            on_epoch(epochs_run, total, time.perf_counter() - epoch_start)
+
+    perm = torch.randperm(len(y_all), generator=gen)
+    n_val = int(len(y_all) * TRAIN_VAL_FRACTION)
+    val_idx, train_idx = perm[:n_val], perm[n_val:]
+    x_train, y_train = x_all[train_idx], y_all[train_idx]
+    x_val, y_val = x_all[val_idx], y_all[val_idx]
+
+    model_local, optimizer = fresh_model()
+    best_loss, best_epoch, stale = float("inf"), TRAIN_MAX_EPOCHS, 0
+    val_accuracy = None
+
+    print("[ML] Training (fast)...")
+    if n_val:
+        best_epoch = 0
+        for epoch in range(1, TRAIN_MAX_EPOCHS + 1):
+            run_epoch(model_local, optimizer, x_train, y_train)
+            model_local.eval()
+            with torch.no_grad():
+                val_loss = loss_fn(model_local(x_val), y_val).item()
+            if val_loss < best_loss - 1e-4:
+                best_loss, best_epoch, stale = val_loss, epoch, 0
+                val_accuracy = accuracy(model_local, x_val, y_val)
+            else:
+                stale += 1
+                if stale >= TRAIN_PATIENCE:
+                    break
+        print(f"[ML] Stopped after {epoch} epochs (best {best_epoch}), val acc {val_accuracy}; "
+              f"refitting on all {len(y_all)} rows")
+        model_local, optimizer = fresh_model()
+    for _ in range(best_epoch):
+        run_epoch(model_local, optimizer, x_all, y_all)
+
+    model_local.eval()
+    training_report.update({
+        "mode": "fast",
+        "seed": seed,
+        "epochs_run": epochs_run,
+        "best_epoch": best_epoch,
+        "best_val_loss": round(best_loss, 4) if n_val else None,
+        "val_accuracy": val_accuracy,
+        "train_accuracy": accuracy(model_local, x_all, y_all),
+        "wall_seconds": round(time.perf_counter() - start, 4),
+    })
+    print(f"[ML] Trained {best_epoch} epochs on the full dataset, "
+          f"accuracy {training_report['train_accuracy']}, {training_report['wall_seconds']}s")
+    return model_local
+
+
+def build_knn(embeddings, labels_tensor):
+    model_local = NearestNeighbourClassifier(embeddings, labels_tensor)
+    if KNN_THRESHOLD == "auto":
+        model_local.calibrate()
+    else:
+        model_local.threshold = float(KNN_THRESHOLD)
+    print(f"[ML] k-NN engine: {len(labels_tensor)} rows, k={model_local.k}, "
+          f"threshold={model_local.threshold:.4f}")
+    return model_local
+
+
+def build_classifier(encoder_local):
+    """Load or train the configured classifier for the current knowledge."""
+    digest = knowledge_hash()
+    with artifact_lock() as locked:
+        blob = load_artifacts(digest)
+        if CLASSIFIER_ENGINE == "knn":
+            if blob is not None:
+                embeddings, labels_tensor = blob["embeddings"], blob["labels"]
+            else:
+                embeddings, labels_tensor = encode_dataset(encoder_local)
+            model_local = build_knn(embeddings, labels_tensor)
+        elif blob is not None:
+            print(f"[ML] Loaded cached classifier {digest[:16]}, skipping training")
+            model_local = RoseClassifier()
+            model_local.load_state_dict(blob["state_dict"])
+        else:
+            embeddings, labels_tensor = encode_dataset(encoder_local)
+            training_epochs.clear()
+            train = fit_classifier_fast if TRAIN_MODE == "fast" else fit_classifier
+            model_local = train(embeddings, labels_tensor, on_epoch=record_epoch)
+            try:
+                save_artifacts(digest, model_local, embeddings, labels_tensor)
+            except OSError as e:
+                print(f"[ML] Could not save artifacts: {e}")
+        if SHARED_WEIGHTS and locked:
+            mmap_weights(model_local, os.path.join(ARTIFACT_DIR, f"classifier_{CLASSIFIER_ENGINE}_{digest[:16]}.pt"))
+    model_local.eval()
+    return model_local
+
+
+def train_model():
+    global encoder, model, model_ready
+
+    with startup_step("load encoder"):
+        encoder_local = load_encoder()
+        if SHARED_WEIGHTS and isinstance(encoder_local, nn.Module):
+            with artifact_lock() as locked:
+                if locked:
+                    name = MODEL_NAME.replace("/", "__")
+                    mmap_weights(encoder_local, os.path.join(ARTIFACT_DIR, f"encoder_{name}.pt"))
+                    print("[ML] Encoder weights memory-mapped")
+
+    with startup_step("build classifier"):
+        model_local = build_classifier(encoder_local)
+    if INFERENCE_QUANTIZE:
+        with startup_step("quantize"):
+            encoder_local, model_local = quantize_for_inference(encoder_local, model_local)
+    elif INFERENCE_DTYPE != "float32":
+        with startup_step(f"cast to {INFERENCE_DTYPE}"):
+            encoder_local, model_local = reduce_precision(encoder_local, model_local)
+    if RELEASE_TRAINING_MEMORY:
+        with startup_step("release training memory"):
+            release_training_memory()
+    # After the release, so the allocator growth warm-up pays for is kept.
+    if INFERENCE_COMPILE != "off":
+        with startup_step(f"compile inference graph ({INFERENCE_COMPILE})"):
+            encoder_local, model_local = compile_for_inference(encoder_local, model_local)
+    if INFERENCE_WARMUP:
+        with startup_step("warm up"):
+            encoder_local, model_local = warm_up(encoder_local, model_local)
+
+    # Assign to global
+    embedding_cache.clear()
+    encoder = encoder_local
+    model = model_local
+    model_ready = True
+    readiness.notify()
+    print("[ML] Training complete. Model ready!")
+
+
+# =========================================================
+# BULK CLASSIFICATION
+# =========================================================
+def predict_proba(embs):
+    net = model  # a hot reload may swap the global mid-request
+    with torch.no_grad():
+        out = net(embs)
+    out = out.float()
+    if isinstance(net, NearestNeighbourClassifier):
+        # k-NN scores are similarity-weighted votes, not logits.
+        return out / out.sum(dim=-1, keepdim=True).clamp(min=1e-12)
+    return torch.softmax(out, dim=-1)
+
+
+def parse_question_line(line):
+    """A JSONL line is an object with "question" (other keys are echoed
+    back), a bare JSON string, or plain text."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return {}, line
+    if isinstance(obj, str):
+        return {}, obj
+    if isinstance(obj, dict) and isinstance(obj.get("question"), str):
+        meta = {k: v for k, v in obj.items() if k != "question"}
+        return meta, obj["question"]
+    raise ValueError('expected {"question": "..."} or a string')
+
+
+def classify_records(records):
+    """Classify `[(meta, question), ...]` in one batched encode and one
+    forward pass, without touching game sessions or the embedding cache."""
+    normalized = [normalize_question(q) for _, q in records]
+    unique = list(dict.fromkeys(normalized))
+    with ENCODE_SECONDS.time():
+        embs = encoder.encode(unique, convert_to_tensor=True, batch_size=CLASSIFY_CHUNK_SIZE)
+    with CLASSIFY_SECONDS.time():
+        probs = predict_proba(embs).tolist()
+    by_text = dict(zip(unique, probs))
+    out = []
+    for (meta, question), norm in zip(records, normalized):
+        p = by_text[norm]
+        best = max(range(len(p)), key=p.__getitem__)
+        out.append(dict(
+            meta,
+            question=question,
+            normalized=norm,
+            label=ID2LABEL[best],
+            scores={ID2LABEL[i]: round(v, 6) for i, v in enumerate(p)},
+        ))
+    return out
+
+
+def classify_lines(lines, first_line=1):
+    """Classify a chunk of raw JSONL lines. Returns one row per non-blank
+    line in input order; lines that fail to parse become error rows."""
+    rows, records = [], []
+    for n, line in enumerate(lines, first_line):
+        try:
+            record = parse_question_line(line)
+        except ValueError as e:
+            rows.append({"line": n, "error": str(e)})
+            continue
+        if record is not None:
+            rows.append(None)
+            records.append(record)
+    results = iter(classify_records(records) if records else ())
+    return [row if row is not None else next(results) for row in rows]
+
+
+def iter_chunks(lines, chunk_size=CLASSIFY_CHUNK_SIZE):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_classified(lines, chunk_size=CLASSIFY_CHUNK_SIZE):
+    """Classify an iterable of JSONL lines chunk by chunk, so memory stays
+    bounded by one chunk however long the input is."""
+    first_line = 1
+    for chunk in iter_chunks(lines, chunk_size):
+        yield from classify_lines(chunk, first_line)
+        first_line += len(chunk)
+
+
+# =========================================================
+# READINESS NOTIFICATION
+# =========================================================
+class Readiness:
+    """Lets async code await `model_ready` flipping in the training thread."""
+
+    def __init__(self):
+        self._loop = None
+        self._event = None
+
+    def _bind(self):
+        if self._event is None:
+            self._loop = asyncio.get_running_loop()
+            self._event = asyncio.Event()
+            if model_ready:
+                self._event.set()
+
+    def notify(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout=None):
+        """Return True once the model is ready, False on timeout."""
+        self._bind()
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+readiness = Readiness()
+
+
+# =========================================================
+# HOT RELOAD
+# =========================================================
+reload_lock = threading.Lock()
+reload_report = {"reloads": 0, "last_error": None, "knowledge_hash": None}
+
+
+def check_concepts(concepts, source):
+    """Validate a {label: [concept, ...]} mapping, raising ValueError."""
+    if not isinstance(concepts, dict):
+        raise ValueError(f"{source}: concepts must be an object of label -> list")
+    unknown = set(concepts) - set(LABELS)
+    if unknown:
+        raise ValueError(f"{source}: unknown labels {sorted(unknown)}")
+    for label, values in concepts.items():
+        if not isinstance(values, list) or not all(isinstance(c, str) for c in values):
+            raise ValueError(f"{source}: concepts for {label!r} must be a list of strings")
+
+
+def check_puzzle(spec, source):
+    """Validate a puzzle file: `concepts` as for the knowledge file, plus
+    optional `guesses` templates using only a {target} placeholder."""
+    if not isinstance(spec, dict) or "concepts" not in spec:
+        raise ValueError(f"{source}: expected an object with 'concepts'")
+    check_concepts(spec["concepts"], source)
+    guesses = spec.get("guesses", [])
+    if not isinstance(guesses, list) or not all(isinstance(g, str) for g in guesses):
+        raise ValueError(f"{source}: guesses must be a list of strings")
+    for g in guesses:
+        try:
+            g.format(target="")
+        except (KeyError, IndexError, ValueError):
+            raise ValueError(f"{source}: bad guess template {g!r}") from None
+
+
+def load_knowledge(path):
+    """Replace CONCEPTS/TEMPLATES in place from a JSON file; either key may
+    be omitted to keep the current value."""
+    with open(path) as fh:
+        data = json.load(fh)
+    # Copies: the current values are cleared below.
+    concepts = dict(data.get("concepts", CONCEPTS))
+    templates = list(data.get("templates", TEMPLATES))
+    check_concepts(concepts, path)
+    if not templates or not all(isinstance(t, str) and "{}" in t for t in templates):
+        raise ValueError("Every template must contain a '{}' placeholder")
+    CONCEPTS.clear()
+    CONCEPTS.update({k: list(v) for k, v in concepts.items()})
+    TEMPLATES[:] = templates
+
+
+def reload_model():
+    """Rebuild the classifier, answer index and fallback from the current
+    knowledge and swap them in. The encoder is kept, and each swap is a
+    single assignment, so in-flight requests finish on whichever version
+    they started with."""
+    global model, answer_index, fallback
+    if encoder is None:
+        raise RuntimeError("Model is still loading")
+    with reload_lock:
+        if KNOWLEDGE_FILE:
+            # Puzzle banks embed the knowledge too; swap and drop them
+            # together so no head mixes old and new templates.
+            puzzles.invalidate(lambda: load_knowledge(KNOWLEDGE_FILE))
+        start = time.perf_counter()
+        model_local = build_classifier(training_encoder())
+        if quantization_report.get("active"):
+            model_local = quantize_module(model_local)
+        elif precision_report.get("active"):
+            model_local = to_dtype(model_local, getattr(torch, INFERENCE_DTYPE))
+        if INFERENCE_COMPILE != "off":
+            model_local = compile_classifier(model_local)
+        if INFERENCE_WARMUP:
+            _, model_local = warm_up(encoder, model_local)
+        index_local = AnswerIndex() if ANSWER_INDEX_ENABLED else None
+        fallback_local = KeywordAnswerer() if FALLBACK_ENABLED else None
+
+        model = model_local
+        answer_index = index_local
+        fallback = fallback_local
+        if RELEASE_TRAINING_MEMORY:
+            release_training_memory()
+        reload_report.update({
+            "reloads": reload_report["reloads"] + 1,
+            "last_error": None,
+            "knowledge_hash": knowledge_hash()[:16],
+            "seconds": round(time.perf_counter() - start, 4),
+        })
+        print(f"[ML] Reloaded classifier in {reload_report['seconds']}s")
+        return dict(reload_report)
+
+
+def watch_knowledge_file():
+    last = None
+    while True:
+        try:
+            mtime = os.stat(KNOWLEDGE_FILE).st_mtime
+        except OSError:
+            mtime = None
+        if mtime is not None and last is not None and mtime != last and model_ready:
+            try:
+                reload_model()
+            except Exception as e:
+                reload_report["last_error"] = str(e)
+                print(f"[ML] Reload failed: {e}")
+        last = mtime
+        time.sleep(KNOWLEDGE_WATCH_SECONDS)
+
+
+if KNOWLEDGE_FILE and os.path.exists(KNOWLEDGE_FILE):
+    load_knowledge(KNOWLEDGE_FILE)
+    answer_index = AnswerIndex() if ANSWER_INDEX_ENABLED else None
+    fallback = KeywordAnswerer() if FALLBACK_ENABLED else None
+
+
+# =========================================================
+# FASTAPI APP
+# =========================================================
+app = FastAPI()
+
+cors_origins = os.environ.get("CORS_ORIGINS", "*")
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=cors_origins.split(","),
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=[SESSION_HEADER],
+)
+
+
+@app.on_event("startup")
+async def startup_event():
+    readiness._bind()
+    if not model_ready:
+        threading.Thread(target=train_model, daemon=True).start()
+    if KNOWLEDGE_FILE and KNOWLEDGE_WATCH_SECONDS > 0:
+        threading.Thread(target=watch_knowledge_file, daemon=True).start()
+
+
+# Baseline for the steps train_model records: what importing this module cost.
+startup_report.append({"step": "import", "rss_after_mb": megabytes(process_rss_bytes())})
+
+if PRELOAD_MODEL:
+    train_model()
+
+
+# =========================================================
+# PYDANTIC MODELS
+# =========================================================
+class SessionRequest(BaseModel):
+    target: Optional[str] = None
+
+
+class QuestionRequest(BaseModel):
+    question: str
+
+
+class GuessRequest(BaseModel):
+    guess: str
+
+
+# =========================================================
+# API ENDPOINTS
+# =========================================================
+@app.get("/api/")
+async def root():
+    return {"message": "Rose Day AI Game API"}
+
+
+def check_target(target):
+    if target is not None and not puzzles.exists(target):
+        raise HTTPException(status_code=404, detail=f"Unknown puzzle: {target!r}")
+    return target
+
+
+@app.post("/api/game/session")
+async def create_session(response: Response, req: Optional[SessionRequest] = None):
+    """Start a game; `{"target": ...}` picks the puzzle (default rose)."""
+    target = check_target(req.target if req is not None else None)
+    session_id = await sessions.create(target)
+    response.headers[SESSION_HEADER] = session_id
+    return {"session_id": session_id, "target": target or DEFAULT_TARGET}
+
+
+@app.get("/api/game/puzzles")
+async def list_puzzles():
+    return {"targets": puzzles.targets(), "default": DEFAULT_TARGET}
+
+
+@app.get("/api/game/status")
+async def get_game_status(response: Response, x_session_id: Optional[str] = Header(None)):
+    state = await sessions.snapshot(resolve_session(x_session_id, response))
+    return {
+        "model_ready": model_ready,
+        "engine": current_engine(),
+        "classifier": CLASSIFIER_ENGINE,
+        "encoder_backend": ENCODER_BACKEND,
+        "training": training_report,
+        "quantization": quantization_report,
+        "precision": precision_report,
+        "compile": compile_report,
+        "startup": startup_report,
+        "target": state["target"],
+        "question_count": state["question_count"],
+        "max_questions": MAX_QUESTIONS,
+        "game_over": state["game_over"],
+        "guessed_correctly": state["guessed_correctly"],
+        "sessions": sessions.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "inference": dict(
+            batcher.stats(),
+            executor_workers=max(1, INFERENCE_WORKERS),
+            torch_threads=torch.get_num_threads(),
+        ),
+        "admission": admission.stats(),
+        "answer_index": answer_index.stats() if answer_index is not None else None,
+        "rules": rules.stats(),
+        "puzzles": puzzles.stats(),
+    }
+
+
+async def puzzle_head(target):
+    """The puzzle head for `target` (None for DEFAULT_TARGET, which the
+    trained classifier answers)."""
+    if target == DEFAULT_TARGET:
+        return None
+    if not model_ready:
+        NOT_READY.inc("puzzle")
+        raise HTTPException(status_code=503, detail="Model is still loading. Please wait...")
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(inference_executor, puzzles.head, target)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown puzzle: {target!r}")
+    except ValueError as e:
+        # Also covers invalid JSON (JSONDecodeError is a ValueError).
+        print(f"[ML] Bad puzzle {target!r}: {e}")
+        raise HTTPException(status_code=500, detail=f"Puzzle {target!r} is misconfigured")
+
+
+async def session_head(session_id):
+    """The puzzle head of the session's target. Without PUZZLES_DIR every
+    game is on DEFAULT_TARGET, so the store is not read at all; replies
+    take the target from the state the store update returns."""
+    if not puzzles.directory:
+        return None
+    return await puzzle_head((await sessions.snapshot(session_id))["target"])
+
+
+def game_over_reply(state):
+    return {
+        "label": "game_over",
+        "response": "Game is already over!",
+        "question_count": state["question_count"],
+        "max_questions": MAX_QUESTIONS,
+        "game_over": True,
+        "guessed_correctly": state["guessed_correctly"],
+    }
+
+
+async def answer_label(question, head, is_disconnected=None):
+    """(label, engine) for `question`. Inference runs off the event loop so
+    status/reset stay responsive."""
+    with NORMALIZE_SECONDS.time():
+        normalized = normalize_question(question)
+    label = answer_index.lookup(normalized) if answer_index is not None and head is None else None
+    if label is not None:
+        return label, "index"
+    if head is not None:
+        return await predict_label_async(normalized, is_disconnected, head), "puzzle"
+    if model_ready:
+        return await predict_label_async(normalized, is_disconnected), "neural"
+    return fallback.answer(normalized), "fallback"
+
+
+async def answer_question(session_id, question, is_disconnected=None):
+    if current_engine() is None:
+        NOT_READY.inc("/api/game/ask")
+        raise HTTPException(status_code=503, detail="Model is still loading. Please wait...")
+
+    head = await session_head(session_id)
+    # Check if user is guessing directly
+    if rules.is_guess(question, head.guesses if head is not None else None):
+        state, counted = await sessions.mark_guessed(session_id)
+        if counted:
+            return {
+                "label": "guessed",
+                "response": f"YES! You guessed it! The answer is {state['target'].upper()}!",
+                "question_count": state["question_count"],
+                "max_questions": MAX_QUESTIONS,
+                "game_over": True,
+                "guessed_correctly": True,
+            }
+    else:
+        # Counted first, in the same single store round trip that tells us
+        # whether the game is over, so a finished game gets no inference
+        # (and no admission slot). A question that then cannot be answered,
+        # e.g. shed with 429/503, is refunded.
+        state, counted = await sessions.advance(session_id, MAX_QUESTIONS)
+        if counted and not state["game_over"]:
+            try:
+                label, engine = await answer_label(question, head, is_disconnected)
+            except Exception:
+                await sessions.refund(session_id)
+                raise
+
+    if not counted:
+        return game_over_reply(state)
+
+    question_count = state["question_count"]
+    if state["game_over"]:
+        return {
+            "label": "game_over",
+            "response": f"20 questions used! The answer was {state['target'].upper()}!",
+            "question_count": question_count,
+            "max_questions": MAX_QUESTIONS,
+            "game_over": True,
+            "guessed_correctly": False,
+        }
+
+    PREDICTIONS.inc(label, engine)
+    return {
+        "label": label,
+        "engine": engine,
+        "question_count": question_count,
+        "max_questions": MAX_QUESTIONS,
+        "game_over": False,
+        "guessed_correctly": False,
+    }
+
+
+async def judge_guess(session_id, guess):
+    head = await session_head(session_id)
+    guess = guess.strip().lower()
+    if rules.is_guess(guess, head.guesses if head is not None else None):
+        state, counted = await sessions.mark_guessed(session_id)
+        if counted:
+            return {
+                "correct": True,
+                "message": f"YES! You guessed it correctly. The answer is {state['target'].upper()}!",
+                "question_count": state["question_count"],
+                "game_over": True,
+            }
+    else:
+        state, counted = await sessions.advance(session_id, MAX_QUESTIONS)
+        if counted:
+            return {
+                "correct": False,
+                "message": f"Nope, it's not '{guess}'!",
+                "question_count": state["question_count"],
+                "game_over": state["game_over"],
+            }
+
+    return {
+        "correct": state["guessed_correctly"],
+        "message": "Game is already over!",
+        "question_count": state["question_count"],
+        "game_over": True,
+    }
+
+
+@app.post("/api/game/ask")
+async def ask_question(req: QuestionRequest, request: Request, response: Response,
+                       x_session_id: Optional[str] = Header(None)):
+    return await answer_question(resolve_session(x_session_id, response), req.question,
+                                 request.is_disconnected)
+
+
+@app.post("/api/game/guess")
+async def make_guess(req: GuessRequest, response: Response,
+                     x_session_id: Optional[str] = Header(None)):
+    return await judge_guess(resolve_session(x_session_id, response), req.guess)
+
+
+@app.post("/api/game/reset")
+async def reset_game(response: Response, x_session_id: Optional[str] = Header(None)):
+    await sessions.reset(resolve_session(x_session_id, response))
+    return {"message": "Game reset successfully", "status": "ok"}
+
+
+# =========================================================
+# PUSH CHANNELS
+# =========================================================
+def readiness_payload():
+    return {"model_ready": model_ready, "engine": current_engine()}
+
+
+async def handle_channel_message(session_id, msg):
+    kind = msg.get("type")
+    try:
+        if kind == "ask":
+            body = await answer_question(session_id, str(msg.get("question", "")))
+        elif kind == "guess":
+            body = await judge_guess(session_id, str(msg.get("guess", "")))
+        elif kind == "reset":
+            await sessions.reset(session_id)
+            body = {"message": "Game reset successfully", "status": "ok"}
+        elif kind == "status":
+            state = await sessions.snapshot(session_id)
+            body = dict(state, max_questions=MAX_QUESTIONS, **readiness_payload())
+        else:
+            body = {"type": "error", "status": 400, "detail": f"Unknown message type: {kind!r}"}
+    except HTTPException as e:
+        body = {"type": "error", "status": e.status_code, "detail": e.detail}
+        if e.headers and "Retry-After" in e.headers:
+            body["retry_after"] = int(e.headers["Retry-After"])
+    body.setdefault("type", kind)
+    if "id" in msg:
+        body["id"] = msg["id"]
+    return body
+
+
+@app.websocket("/api/game/ws")
+async def game_channel(websocket: WebSocket, session_id: Optional[str] = None,
+                       target: Optional[str] = None):
+    """One persistent connection per player carrying ask/guess/reset/status
+    messages (`{"type": ..., "id": ...}`, replies echo both) and a pushed
+    `ready` message when the neural model comes up. Without a session_id a
+    new game is started, on `target` if given."""
+    await websocket.accept()
+    session_id = (session_id or "").strip()[:64]
+    if not session_id:
+        if target is not None and not puzzles.exists(target):
+            await websocket.send_json({"type": "error", "status": 404, "detail": f"Unknown puzzle: {target!r}"})
+            await websocket.close(code=1008)
+            return
+        session_id = await sessions.create(target)
+    await websocket.send_json(dict(readiness_payload(), type="hello", session_id=session_id))
+
+    async def push_ready():
+        await readiness.wait()
+        await websocket.send_json(dict(readiness_payload(), type="ready"))
+
+    ready_task = None if model_ready else asyncio.create_task(push_ready())
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                msg = json.loads(raw)
+                if not isinstance(msg, dict):
+                    raise ValueError("message must be a JSON object")
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "status": 400, "detail": str(e)})
+                continue
+            await websocket.send_json(await handle_channel_message(session_id, msg))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if ready_task is not None:
+            ready_task.cancel()
+
+
+@app.get("/api/game/events")
+async def readiness_events():
+    """Server-sent events: the current readiness, then `ready` once the
+    neural model is up (with keep-alive comments while waiting)."""
+    async def stream():
+        yield f"event: status\ndata: {json.dumps(readiness_payload())}\n\n"
+        while not model_ready:
+            if not await readiness.wait(timeout=15):
+                yield ": keep-alive\n\n"
+        yield f"event: ready\ndata: {json.dumps(readiness_payload())}\n\n"
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse that leaves `receive` to the body iterator.
+
+    The stock response listens for disconnects on `receive`, which swallows
+    request-body messages; here the body is still being read while results
+    are written, and request.stream() raises ClientDisconnect on its own.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_request_lines(request):
+    buffer = b""
+    async for piece in request.stream():
+        buffer += piece
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", errors="replace")
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace")
+
+
+@app.post("/api/classify/batch")
+async def classify_batch_endpoint(request: Request):
+    """Score questions without playing a game.
+
+    `application/json` bodies take `{"questions": [...]}` and return
+    `{"results": [...]}`. Anything else is read as a JSONL stream and
+    answered as a JSONL stream, one chunk of CLASSIFY_CHUNK_SIZE lines
+    at a time, so memory stays flat regardless of upload size.
+    """
+    if not model_ready:
+        NOT_READY.inc("/api/classify/batch")
+        raise HTTPException(status_code=503, detail="Model is still loading...")
+    loop = asyncio.get_running_loop()
+
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            questions = (await request.json())["questions"]
+        except (ValueError, KeyError, TypeError):
+            questions = None
+        if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+            raise HTTPException(status_code=422, detail='Expected {"questions": ["...", ...]}')
+        records = [({}, q) for q in questions]
+        results = []
+        for start in range(0, len(records), CLASSIFY_CHUNK_SIZE):
+            chunk = records[start:start + CLASSIFY_CHUNK_SIZE]
+            results += await loop.run_in_executor(bulk_executor, classify_records, chunk)
+        return {"results": results}
+
+    async def stream():
+        chunk, first_line = [], 1
+        async for line in iter_request_lines(request):
+            chunk.append(line)
+            if len(chunk) >= CLASSIFY_CHUNK_SIZE:
+                rows = await loop.run_in_executor(bulk_executor, classify_lines, chunk, first_line)
+                first_line += len(chunk)
+                chunk = []
+                yield "".join(json.dumps(r) + "\n" for r in rows)
+        if chunk:
+            rows = await loop.run_in_executor(bulk_executor, classify_lines, chunk, first_line)
+            yield "".join(json.dumps(r) + "\n" for r in rows)
+
+    return DuplexStreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/api/admin/reload")
+async def reload_classifier(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if not model_ready:
+        raise HTTPException(status_code=503, detail="Model is still loading...")
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, reload_model)
+    except (OSError, ValueError) as e:
+        reload_report["last_error"] = str(e)
+        raise HTTPException(status_code=400, detail=f"Reload failed: {e}")
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    cache = embedding_cache.stats()
+    lines = []
+    for metric in (NORMALIZE_SECONDS, ENCODE_SECONDS, CLASSIFY_SECONDS, PREDICTIONS, NOT_READY, SHED):
+        lines += metric.render()
+    lines += gauge("rose_model_ready", "1 once the neural model serves answers.",
+                   [({}, int(model_ready))])
+    lines += gauge("rose_training_epoch_loss", "Summed loss per epoch of the last training run.",
+                   [({"epoch": e}, loss) for e, loss, _ in training_epochs])
+    lines += gauge("rose_training_epoch_seconds", "Wall time per epoch of the last training run.",
+                   [({"epoch": e}, sec) for e, _, sec in training_epochs])
+    live_sessions = sessions.stats()["sessions"]
+    if live_sessions is not None:
+        lines += gauge("rose_sessions", "Live game sessions.", [({}, live_sessions)])
+    lines += counter("rose_embedding_cache_events_total", "Embedding cache hits, misses and evictions.",
+                     [({"event": k}, cache[k]) for k in ("hits", "misses", "evictions")])
+    lines += gauge("rose_inference_queue_depth", "Questions waiting for the batcher.",
+                   [({}, batcher.stats()["queue_depth"])])
+    lines += gauge("rose_inference_in_flight", "Questions admitted to inference and not yet answered.",
+                   [({}, admission.in_flight)])
+    rss = process_rss_bytes()
+    if rss is not None:
+        lines += gauge("process_resident_memory_bytes", "Resident set size of this process.",
+                       [({}, rss)])
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
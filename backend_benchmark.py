@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Offline performance benchmarks for the Rose Day backend.
+
+Drives the FastAPI app in-process (no server, no network) and writes
+machine-readable JSON so runs can be diffed for regressions:
+
+    python backend_benchmark.py --output bench.json
+    python backend_benchmark.py --concurrency 1 8 32 --requests 400
+    python backend_benchmark.py --compare-encoders
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import httpx  # noqa: E402
+import server  # noqa: E402
+
+KNOWN_QUESTIONS = [
+    "Is it a plant?", "Is it red?", "Is it an animal?", "Is it a planet?",
+    "Is it expensive?", "Can it be described as fragrant?",
+]
+NOVEL_QUESTIONS = [
+    "Does it smell nice?", "Would I find it in a garden?", "Can I eat it?",
+    "Is it something you give on a date?", "Does it need sunlight?",
+    "Is it bigger than a car?", "Could it sting me?", "Do people grow it at home?",
+]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def latency_summary(samples):
+    ms = [s * 1000.0 for s in samples]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else None,
+        "p50_ms": round(percentile(ms, 0.50), 3) if ms else None,
+        "p95_ms": round(percentile(ms, 0.95), 3) if ms else None,
+        "p99_ms": round(percentile(ms, 0.99), 3) if ms else None,
+        "max_ms": round(max(ms), 3) if ms else None,
+    }
+
+
+class RoseDayBenchmark:
+    def __init__(self, requests_per_level=200, concurrency=(1, 4, 16, 64), repeats=5):
+        self.requests_per_level = requests_per_level
+        self.concurrency = concurrency
+        self.repeats = repeats
+        self.results = {}
+
+    def bench_generate_dataset(self):
+        timings = []
+        for _ in range(self.repeats):
+            start = time.perf_counter()
+            server.generate_dataset()
+            timings.append(time.perf_counter() - start)
+        self.results["generate_dataset"] = latency_summary(timings)
+
+    def bench_cold_start(self):
+        """Time train_model end to end, first without and then with the
+        artifact cache, in a throwaway ARTIFACT_DIR."""
+        original = server.ARTIFACT_DIR
+        cold_start = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            server.ARTIFACT_DIR = tmp
+            try:
+                for phase in ("untrained", "cached_artifacts"):
+                    server.model_ready = False
+                    start = time.perf_counter()
+                    server.train_model()
+                    cold_start[phase] = {"time_to_model_ready_s": round(time.perf_counter() - start, 4)}
+            finally:
+                server.ARTIFACT_DIR = original
+        self.results["cold_start"] = cold_start
+
+    def bench_training(self):
+        texts = [q for q, _ in server.generate_dataset()]
+        encode_times = []
+        for _ in range(self.repeats):
+            start = time.perf_counter()
+            server.encoder.encode(texts, convert_to_tensor=True)
+            encode_times.append(time.perf_counter() - start)
+
+        embeddings, labels = server.encode_dataset(server.training_encoder())
+        # Both training modes on the same embeddings, each scored on the
+        # full knowledge base, so "fast" is checked against the DataLoader
+        # loop rather than only against its own validation split.
+        modes, saved_report = {}, dict(server.training_report)
+        for mode, train in (("fast", server.fit_classifier_fast), ("dataloader", server.fit_classifier)):
+            epochs = []
+            server.training_report.clear()
+            start = time.perf_counter()
+            model = train(
+                embeddings, labels,
+                on_epoch=lambda epoch, loss, seconds: epochs.append(
+                    {"epoch": epoch, "loss": round(loss, 4), "seconds": round(seconds, 5)}
+                ),
+            )
+            modes[mode] = {
+                "fit_seconds": round(time.perf_counter() - start, 4),
+                "dataset_accuracy": server.accuracy(model, embeddings, labels),
+                "report": dict(server.training_report),
+                "epochs": epochs,
+            }
+        server.training_report.clear()
+        server.training_report.update(saved_report)
+        self.results["training"] = {
+            "samples": len(texts),
+            "encode_dataset": latency_summary(encode_times),
+            "modes": modes,
+        }
+
+    async def _ask_level(self, client, concurrency, questions, unique=False):
+        """`unique` tags every question with its request number so none is
+        served from the embedding cache or answer index."""
+        sem = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+
+        async def one(i):
+            nonlocal errors
+            async with sem:
+                question = questions[i % len(questions)]
+                if unique:
+                    question = f"{question} #{concurrency}-{i}"
+                start = time.perf_counter()
+                r = await client.post(
+                    "/api/game/ask",
+                    json={"question": question},
+                    headers={server.SESSION_HEADER: uuid.uuid4().hex},
+                )
+                latencies.append(time.perf_counter() - start)
+                if r.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(self.requests_per_level)))
+        wall = time.perf_counter() - start
+        return dict(
+            latency_summary(latencies),
+            concurrency=concurrency,
+            errors=errors,
+            throughput_rps=round(len(latencies) / wall, 2),
+        )
+
+    async def _bench_ask(self):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            scenarios = {}
+            # "novel" must measure the model path on every request, not
+            # just the first per question, so its questions never repeat.
+            for name, questions, unique in (("known", KNOWN_QUESTIONS, False),
+                                            ("novel", NOVEL_QUESTIONS, True)):
+                server.embedding_cache.clear()
+                scenarios[name] = [
+                    await self._ask_level(client, c, questions, unique) for c in self.concurrency
+                ]
+            return scenarios
+
+    def bench_ask(self):
+        self.results["ask"] = asyncio.run(self._bench_ask())
+
+    def bench_encoders(self):
+        """Compare the static (distilled) encoder with the full transformer:
+        encode speed, table size, and accuracy of a classifier trained on
+        each encoder's embeddings of the generated dataset."""
+        texts, labels = zip(*server.generate_dataset(size=None, seed=server.TRAIN_SEED))
+        texts, labels = list(texts), server.torch.tensor(labels)
+        train = server.fit_classifier_fast if server.TRAIN_MODE == "fast" else server.fit_classifier
+        encoders = {
+            "transformer": server.load_sentence_transformer(),
+            "static": server.load_static_encoder(),
+        }
+        report, preds = {}, {}
+        for name, enc in encoders.items():
+            enc.encode(texts[:8])
+            start = time.perf_counter()
+            for _ in range(self.repeats):
+                embeddings = enc.encode(texts, convert_to_tensor=True)
+            seconds = (time.perf_counter() - start) / self.repeats
+            model = train(embeddings, labels)
+            with server.torch.no_grad():
+                preds[name] = server.torch.argmax(model(embeddings), dim=-1)
+            report[name] = {
+                "encode_seconds": round(seconds, 5),
+                "per_sentence_us": round(seconds / len(texts) * 1e6, 2),
+                "dataset_accuracy": server.accuracy(model, embeddings, labels),
+                "training": dict(server.training_report),
+            }
+        report["static"]["table_bytes"] = encoders["static"].nbytes()
+        report["label_agreement"] = (preds["static"] == preds["transformer"]).float().mean().item()
+        report["encode_speedup"] = round(
+            report["transformer"]["encode_seconds"] / report["static"]["encode_seconds"], 2
+        )
+        self.results["encoders"] = report
+
+    def run(self, compare_encoders=False):
+        steps = [
+            ("generate_dataset", self.bench_generate_dataset),
+            ("cold start", self.bench_cold_start),
+            ("training", self.bench_training),
+            ("/api/game/ask", self.bench_ask),
+        ]
+        if compare_encoders:
+            steps.append(("static vs transformer encoder", self.bench_encoders))
+        for name, step in steps:
+            print(f"⏱  {name}...")
+            step()
+        self.results["meta"] = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "torch": server.torch.__version__,
+            "torch_threads": server.torch.get_num_threads(),
+            "cpu_count": os.cpu_count(),
+            "classifier": server.CLASSIFIER_ENGINE,
+            "requests_per_level": self.requests_per_level,
+        }
+        return self.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--repeats", type=int, default=5, help="repeats for dataset/encode timings")
+    parser.add_argument("--output", default=None, help="write JSON results to this path")
+    parser.add_argument("--compare-encoders", action="store_true",
+                        help="also compare the static encoder against the transformer")
+    args = parser.parse_args()
+
+    print("🌹 Rose Day Benchmark Suite")
+    print("=" * 50)
+    bench = RoseDayBenchmark(args.requests, tuple(args.concurrency), args.repeats)
+    results = bench.run(compare_encoders=args.compare_encoders)
+
+    for name, levels in results["ask"].items():
+        for level in levels:
+            print(f"ask[{name}] c={level['concurrency']:<3} {level['throughput_rps']:>9} rps  "
+                  f"p50={level['p50_ms']}ms p95={level['p95_ms']}ms p99={level['p99_ms']}ms")
+
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(payload + "\n")
+        print(f"\n📄 Results written to {args.output}")
+    else:
+        print(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@ import { HelpCircle, Sparkles, Loader2 } from 'lucide-react';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const WS_URL = `${(BACKEND_URL || window.location.origin).replace(/^http/, 'ws')}/api/game/ws`;
 
 const THINK_SOUND = 'https://assets.mixkit.co/sfx/preview/mixkit-modern-click-box-check-1120.mp3';
 
@@ -62,24 +63,97 @@ export const AIGame = ({ onReveal }) => {
   const chatEndRef = useRef(null);
   const inputRef = useRef(null);
   const pollRef = useRef(null);
+  const sessionRef = useRef(null);
+  const wsRef = useRef(null);
+  const pendingRef = useRef(new Map());
+  const nextIdRef = useRef(0);
+
+  const sessionHeaders = () => (
+    sessionRef.current ? { 'X-Session-Id': sessionRef.current } : {}
+  );
+
+  const markReady = () => {
+    setModelReady(true);
+    setCheckingModel(false);
+    setTimeout(() => inputRef.current?.focus(), 300);
+  };
 
   useEffect(() => {
+    // HTTP polling is only the fallback when the WebSocket cannot connect.
     const checkStatus = async () => {
       try {
-        const res = await fetch(`${API}/game/status`);
+        if (!sessionRef.current) {
+          const s = await fetch(`${API}/game/session`, { method: 'POST' });
+          sessionRef.current = (await s.json()).session_id;
+        }
+        const res = await fetch(`${API}/game/status`, { headers: sessionHeaders() });
         const data = await res.json();
-        if (data.model_ready) {
-          setModelReady(true);
-          setCheckingModel(false);
+        if (data.model_ready || data.engine) {
           clearInterval(pollRef.current);
-          await fetch(`${API}/game/reset`, { method: 'POST' });
-          setTimeout(() => inputRef.current?.focus(), 300);
+          markReady();
         }
       } catch (e) { /* not ready */ }
     };
-    checkStatus();
-    pollRef.current = setInterval(checkStatus, 2000);
-    return () => clearInterval(pollRef.current);
+    const startPolling = () => {
+      if (pollRef.current) return;
+      checkStatus();
+      pollRef.current = setInterval(checkStatus, 2000);
+    };
+
+    let ws;
+    try {
+      ws = new WebSocket(WS_URL);
+    } catch (e) {
+      startPolling();
+      return () => clearInterval(pollRef.current);
+    }
+    wsRef.current = ws;
+    ws.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.id !== undefined && pendingRef.current.has(data.id)) {
+        pendingRef.current.get(data.id)(data);
+        pendingRef.current.delete(data.id);
+        return;
+      }
+      if (data.type === 'hello') sessionRef.current = data.session_id;
+      if ((data.type === 'hello' || data.type === 'ready') && (data.model_ready || data.engine)) {
+        markReady();
+      }
+    };
+    ws.onclose = () => {
+      wsRef.current = null;
+      pendingRef.current.forEach((resolve) => resolve(null));
+      pendingRef.current.clear();
+      startPolling();
+    };
+    return () => {
+      clearInterval(pollRef.current);
+      ws.onclose = null;
+      ws.close();
+    };
+  }, []);
+
+  // Sends over the game socket when it is open, otherwise plain HTTP.
+  const request = useCallback(async (type, body) => {
+    const ws = wsRef.current;
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      const id = ++nextIdRef.current;
+      const reply = await new Promise((resolve) => {
+        pendingRef.current.set(id, resolve);
+        ws.send(JSON.stringify({ type, id, ...body }));
+      });
+      if (reply && reply.type === 'error') throw new Error(reply.detail);
+      if (reply) return reply;
+    }
+    const res = await fetch(`${API}/game/${type}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...sessionHeaders() },
+      body: JSON.stringify(body),
+    });
+    // 429/503 (busy or still loading) leave the game untouched; surface
+    // them as a retryable hiccup rather than as an answer.
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    return res.json();
   }, []);
 
   useEffect(() => {
@@ -106,12 +180,7 @@ export const AIGame = ({ onReveal }) => {
     } catch (e) { /* silent */ }
 
     try {
-      const res = await fetch(`${API}/game/ask`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ question: trimmed }),
-      });
-      const data = await res.json();
+      const data = await request('ask', { question: trimmed });
 
       await new Promise((r) => setTimeout(r, 800 + Math.random() * 1000));
 
@@ -150,7 +219,7 @@ export const AIGame = ({ onReveal }) => {
         { type: 'ai', text: "Hmm, I had a hiccup. Try again!" },
       ]);
     }
-  }, [input, isThinking, isRevealing, modelReady, triggerReveal]);
+  }, [input, isThinking, isRevealing, modelReady, triggerReveal, request]);
 
   const handleGuess = useCallback(async () => {
     const trimmed = input.trim();
@@ -161,12 +230,7 @@ export const AIGame = ({ onReveal }) => {
     setIsThinking(true);
 
     try {
-      const res = await fetch(`${API}/game/guess`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ guess: trimmed }),
-      });
-      const data = await res.json();
+      const data = await request('guess', { guess: trimmed });
 
       await new Promise((r) => setTimeout(r, 800));
 
@@ -202,7 +266,7 @@ export const AIGame = ({ onReveal }) => {
         { type: 'ai', text: "Something went wrong, try again!" },
       ]);
     }
-  }, [input, isThinking, isRevealing, modelReady, questionCount, triggerReveal]);
+  }, [input, isThinking, isRevealing, modelReady, questionCount, triggerReveal, request]);
 
   const handleKeyDown = (e) => {
     if (e.key === 'Enter' && !e.shiftKey) {
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import server  # noqa: E402
+from tests.stubs import StubEncoder  # noqa: E402
+
+
+@pytest.fixture
+def trained(monkeypatch, tmp_path):
+    """server after train_model() with the stub encoder, artifacts in a
+    temporary directory; globals and knowledge are restored afterwards."""
+    monkeypatch.setattr(server, "ARTIFACT_DIR", str(tmp_path))
+    monkeypatch.setattr(server, "load_sentence_transformer", StubEncoder)
+    for name in ("encoder", "model", "model_ready", "answer_index", "fallback"):
+        monkeypatch.setattr(server, name, getattr(server, name))
+    monkeypatch.setattr(server, "CONCEPTS", {k: list(v) for k, v in server.CONCEPTS.items()})
+    monkeypatch.setattr(server, "TEMPLATES", list(server.TEMPLATES))
+    server.embedding_store.release()
+    server.train_model()
+    yield server
+    server.embedding_store.release()
+    server.embedding_cache.clear()
+    server.puzzles.invalidate()
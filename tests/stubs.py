@@ -0,0 +1,47 @@
+"""A bag-of-words stand-in for SentenceTransformer, so tests run without
+downloading MiniLM. Same encode() contract, deterministic, fast."""
+import hashlib
+import sys
+import time
+import types
+
+import numpy as np
+import torch
+
+DIM = 384
+
+
+class StubEncoder:
+    def __init__(self, name="stub", delay=0.0):
+        self.name = name
+        self.delay = delay
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def _one(self, text):
+        v = np.zeros(DIM, dtype=np.float32)
+        for word in text.lower().replace("?", "").split():
+            v[int(hashlib.md5(word.encode()).hexdigest(), 16) % DIM] += 1.0
+        n = np.linalg.norm(v)
+        return v / n if n else v
+
+    def encode(self, sentences, convert_to_tensor=False, **kwargs):
+        single = isinstance(sentences, str)
+        batch = [sentences] if single else list(sentences)
+        self.calls.append(len(batch))
+        if self.delay:
+            time.sleep(self.delay)
+        arr = np.stack([self._one(s) for s in batch]) if batch else np.zeros((0, DIM), dtype=np.float32)
+        if single:
+            arr = arr[0]
+        return torch.from_numpy(arr) if convert_to_tensor else arr
+
+
+def install():
+    """Make `from sentence_transformers import SentenceTransformer` return
+    the stub, for code that imports server in a fresh process."""
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = StubEncoder
+    sys.modules["sentence_transformers"] = module
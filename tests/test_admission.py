@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import server
+from tests.stubs import StubEncoder
+
+
+def shed(reason):
+    return server.SHED.values.get((reason,), 0)
+
+
+def test_admit_caps_in_flight_and_sheds_with_429():
+    admission = server.AdmissionController(limit=2, deadline_ms=500)
+    before = shed("queue_full")
+    with admission.admit() as deadline:
+        assert 0.4 < deadline - time.monotonic() <= 0.5
+        with admission.admit():
+            with pytest.raises(server.HTTPException) as e:
+                with admission.admit():
+                    pass
+    assert e.value.status_code == 429
+    assert e.value.headers["Retry-After"] == str(server.SHED_RETRY_AFTER)
+    assert shed("queue_full") == before + 1
+    assert admission.in_flight == 0 and admission.admitted == 2
+
+
+def test_admit_releases_its_slot_on_error():
+    admission = server.AdmissionController(limit=1)
+    with pytest.raises(RuntimeError):
+        with admission.admit():
+            raise RuntimeError
+    with admission.admit():
+        assert admission.in_flight == 1
+    assert admission.in_flight == 0
+
+
+def test_wait_for_inference_returns_the_result():
+    async def run():
+        fut = asyncio.get_running_loop().create_future()
+        fut.set_result("yes")
+        return await server.wait_for_inference(fut, time.monotonic() + 1, None)
+
+    assert asyncio.run(run()) == "yes"
+
+
+def test_wait_for_inference_cancels_at_the_deadline():
+    async def run():
+        fut = asyncio.get_running_loop().create_future()
+        with pytest.raises(server.DeadlineExceeded):
+            await server.wait_for_inference(fut, time.monotonic() + 0.05, None)
+        return fut
+
+    assert asyncio.run(run()).cancelled()
+
+
+def test_wait_for_inference_gives_up_when_the_client_leaves():
+    before = shed("disconnected")
+
+    async def gone():
+        return True
+
+    async def run():
+        fut = asyncio.get_running_loop().create_future()
+        with pytest.raises(server.HTTPException) as e:
+            await server.wait_for_inference(fut, time.monotonic() + 5, gone)
+        return fut, e.value
+
+    fut, error = asyncio.run(run())
+    assert fut.cancelled()
+    assert error.status_code == 503 and "Retry-After" in error.headers
+    assert shed("disconnected") == before + 1
+
+
+@pytest.fixture
+def overloaded(trained, monkeypatch):
+    """One admission slot, a 100ms deadline and a 300ms encoder."""
+    monkeypatch.setattr(trained, "encoder", StubEncoder(delay=0.3))
+    monkeypatch.setattr(trained, "admission", trained.AdmissionController(limit=1, deadline_ms=100))
+    monkeypatch.setattr(trained, "answer_index", None)
+    return trained
+
+
+@pytest.mark.parametrize("batching", [True, False])
+def test_ask_sheds_with_429_and_503_and_refunds(overloaded, monkeypatch, batching):
+    monkeypatch.setattr(overloaded, "INFER_BATCHING", batching)
+    monkeypatch.setattr(overloaded, "batcher", overloaded.InferenceBatcher())
+
+    async def run():
+        transport = httpx.ASGITransport(app=overloaded.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            async def ask(sid, question):
+                return await client.post("/api/game/ask", json={"question": question},
+                                         headers={"X-Session-Id": sid})
+            replies = await asyncio.gather(ask("a", "is it purple"), ask("b", "is it orange"))
+            status = await client.get("/api/game/status", headers={"X-Session-Id": "a"})
+            return replies, status.json()
+
+    replies, status = asyncio.run(run())
+    assert sorted(r.status_code for r in replies) == [429, 503]
+    assert all(r.headers["Retry-After"] == str(overloaded.SHED_RETRY_AFTER) for r in replies)
+    assert status["question_count"] == 0
+    assert overloaded.admission.in_flight == 0
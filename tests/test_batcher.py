@@ -0,0 +1,94 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from tests.stubs import StubEncoder
+
+
+@pytest.fixture
+def slow(trained, monkeypatch):
+    """Swap in a stub encoder that sleeps per encode call."""
+    def use(delay):
+        encoder = StubEncoder(delay=delay)
+        monkeypatch.setattr(trained, "encoder", encoder)
+        return encoder
+    return use
+
+
+def test_concurrent_submits_share_one_batch(trained, slow):
+    encoder = slow(0.0)
+    batcher = trained.InferenceBatcher(max_batch=8, max_wait_ms=200)
+    texts = ["is it red", "is it a plant", "is it red", "is it alive"]
+    futures = [batcher.submit(t) for t in texts]
+    labels = [f.result(timeout=5) for f in futures]
+    assert labels == trained.classify_batch(texts)
+    # One encode over the unique texts for the batch (the second call
+    # above is classify_batch itself).
+    assert encoder.calls[0] == 3
+    assert batcher.batches == 1 and batcher.items == 4
+
+
+def test_batches_are_capped_at_max_batch(trained, slow):
+    slow(0.0)
+    batcher = trained.InferenceBatcher(max_batch=2, max_wait_ms=200)
+    futures = [batcher.submit(f"is it thing {i}") for i in range(5)]
+    for f in futures:
+        f.result(timeout=5)
+    assert batcher.max_batch_seen == 2
+    assert sum(size * n for size, n in batcher.batch_size_counts.items()) == 5
+
+
+def test_live_drops_cancelled_and_expired_items(trained):
+    batcher = trained.InferenceBatcher()
+    cancelled, expired, live, no_deadline = Future(), Future(), Future(), Future()
+    cancelled.cancel()
+    now = time.monotonic()
+    kept = batcher._live([
+        ("a", cancelled, now + 10),
+        ("b", expired, now - 1),
+        ("c", live, now + 10),
+        ("d", no_deadline, None),
+    ])
+    assert kept == [("c", live), ("d", no_deadline)]
+    assert isinstance(expired.exception(), trained.DeadlineExceeded)
+    assert live.running() and no_deadline.running()
+
+
+def test_item_expiring_behind_a_slow_batch_is_never_encoded(trained, slow):
+    encoder = slow(0.3)
+    batcher = trained.InferenceBatcher(max_batch=1, max_wait_ms=0)
+    first = batcher.submit("is it red")
+    time.sleep(0.05)
+    late = batcher.submit("is it blue", time.monotonic() + 0.05)
+    assert first.result(timeout=5)
+    with pytest.raises(trained.DeadlineExceeded):
+        late.result(timeout=5)
+    assert encoder.calls == [1]
+
+
+def test_cancelled_future_is_skipped(trained, slow):
+    encoder = slow(0.3)
+    batcher = trained.InferenceBatcher(max_batch=1, max_wait_ms=0)
+    first = batcher.submit("is it red")
+    time.sleep(0.05)
+    gone = batcher.submit("is it blue")
+    assert gone.cancel()
+    after = batcher.submit("is it green")
+    assert first.result(timeout=5) and after.result(timeout=5)
+    assert encoder.calls == [1, 1]
+    assert batcher.items == 2
+
+
+def test_worker_survives_a_failed_batch(trained, monkeypatch):
+    batcher = trained.InferenceBatcher(max_batch=1, max_wait_ms=0)
+    real = trained.classify_batch
+
+    def fail_once(texts):
+        monkeypatch.setattr(trained, "classify_batch", real)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(trained, "classify_batch", fail_once)
+    with pytest.raises(RuntimeError):
+        batcher.submit("is it red").result(timeout=5)
+    assert batcher.submit("is it red").result(timeout=5)
@@ -0,0 +1,88 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+import server
+
+
+class CountingStore(server.RedisSessionStore):
+    """Redis store that records which operations each request issued."""
+
+    def __init__(self):
+        super().__init__(client=fakeredis.FakeAsyncRedis(decode_responses=True))
+        self.ops = []
+
+    async def snapshot(self, session_id):
+        self.ops.append("snapshot")
+        return await super().snapshot(session_id)
+
+    async def advance(self, session_id, max_questions):
+        self.ops.append("advance")
+        return await super().advance(session_id, max_questions)
+
+    async def refund(self, session_id):
+        self.ops.append("refund")
+        return await super().refund(session_id)
+
+    async def mark_guessed(self, session_id):
+        self.ops.append("mark_guessed")
+        return await super().mark_guessed(session_id)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = CountingStore()
+    monkeypatch.setattr(server, "sessions", store)
+    # Fallback engine only: no encoder or classifier needed.
+    monkeypatch.setattr(server, "model_ready", False)
+    monkeypatch.setattr(server, "fallback", server.KeywordAnswerer())
+    monkeypatch.setattr(server.puzzles, "directory", "")
+    return store
+
+
+def ask(question, session_id="s"):
+    return asyncio.run(server.answer_question(session_id, question))
+
+
+def test_ask_is_one_store_round_trip(store):
+    reply = ask("Is it a plant?")
+    assert reply["question_count"] == 1 and "label" in reply
+    assert store.ops == ["advance"]
+
+
+def test_finished_game_gets_no_inference(store, monkeypatch):
+    ask("is it a rose")
+    calls = []
+
+    async def answer_label(*args, **kwargs):
+        calls.append(args)
+        return "yes", "test"
+
+    monkeypatch.setattr(server, "answer_label", answer_label)
+    store.ops.clear()
+    reply = ask("Is it red?")
+    assert reply["label"] == "game_over" and reply["guessed_correctly"]
+    assert calls == []
+    assert store.ops == ["advance"]
+
+
+def test_last_question_over_budget_is_not_answered(store, monkeypatch):
+    monkeypatch.setattr(server, "MAX_QUESTIONS", 1)
+    ask("Is it red?")
+    reply = ask("Is it a plant?")
+    assert reply["game_over"] and reply["question_count"] == 2
+
+
+def test_shed_question_is_refunded(store, monkeypatch):
+    ask("Is it a plant?")
+
+    async def shed(*args, **kwargs):
+        raise server.overloaded(429, "busy")
+
+    monkeypatch.setattr(server, "answer_label", shed)
+    with pytest.raises(server.HTTPException) as e:
+        ask("Is it red?")
+    assert e.value.status_code == 429
+    assert store.ops[-2:] == ["advance", "refund"]
+    assert asyncio.run(store.snapshot("s"))["question_count"] == 1
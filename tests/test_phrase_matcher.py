@@ -0,0 +1,45 @@
+import server
+from server import PhraseMatcher
+
+
+def test_no_match():
+    assert PhraseMatcher([("rose", 0)]).best("a tulip") is None
+    assert PhraseMatcher([]).best("anything") is None
+
+
+def test_lowest_priority_wins_wherever_it_occurs():
+    m = PhraseMatcher([("red", 2), ("is it red", 1), ("flower", 0)])
+    assert m.best("is it red") == 1
+    assert m.best("is it a red flower") == 0
+    assert m.best("reddish") == 2
+
+
+def test_overlapping_and_nested_phrases():
+    m = PhraseMatcher([("she", 3), ("he", 1), ("hers", 0), ("his", 2)])
+    assert m.best("ushe") == 1
+    assert m.best("ushers") == 0
+    assert m.best("this") == 2
+    assert m.best("s h e") is None
+
+
+def test_match_found_through_failure_links():
+    m = PhraseMatcher([("abcd", 0), ("bce", 1)])
+    assert m.best("abce") == 1
+    assert m.best("xabcd") == 0
+
+
+def test_duplicate_phrase_keeps_lowest_priority():
+    assert PhraseMatcher([("bloom", 5), ("bloom", 2)]).best("in bloom") == 2
+
+
+def test_agrees_with_naive_scan():
+    phrases = [(p, i) for i, p in enumerate(["is it", "it a", "a rose", "rose", "ose", "s i"])]
+    m = PhraseMatcher(phrases)
+    for text in ["is it a rose", "rose", "nose", "it a", "ais i", "", "roses is it"]:
+        expected = min((i for p, i in phrases if p in text), default=None)
+        assert m.best(text) == expected, text
+
+
+def test_rule_engine_guesses():
+    assert server.rules.is_guess("is it a rose")
+    assert not server.rules.is_guess("is it a tulip")
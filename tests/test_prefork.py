@@ -0,0 +1,49 @@
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.join(os.path.dirname(TESTS), "backend")
+
+# Runs in a fresh process: PRELOAD_MODEL trains at import, as under
+# gunicorn --preload, then a forked "worker" answers a batch.
+WORKER = """
+import os, sys
+sys.path[:0] = [{tests!r}, {backend!r}]
+import stubs
+stubs.install()
+import server
+pid = os.fork()
+if pid == 0:
+    texts = [q for q, _ in server.generate_dataset(size=256, seed=0)]
+    embs = server.encoder.encode(texts, convert_to_tensor=True)
+    labels = server.predict_proba(embs).argmax(dim=-1)
+    os._exit(0 if len(labels) == len(texts) else 1)
+_, status = os.waitpid(pid, 0)
+sys.exit(os.waitstatus_to_exitcode(status))
+"""
+
+
+def test_preforked_worker_can_run_inference(tmp_path):
+    env = dict(
+        os.environ,
+        PRELOAD_MODEL="1",
+        TORCH_NUM_THREADS="4",
+        ARTIFACT_DIR=str(tmp_path),
+        INFERENCE_WARMUP="1",
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-c", WORKER.format(tests=TESTS, backend=BACKEND)],
+        env=env, start_new_session=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        _, err = proc.communicate(timeout=60)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.communicate()
+        pytest.fail("forked worker hung on its first inference")
+    assert proc.returncode == 0, err.decode()[-2000:]
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def knowledge(trained, monkeypatch, tmp_path):
+    path = tmp_path / "knowledge.json"
+    monkeypatch.setattr(trained, "KNOWLEDGE_FILE", str(path))
+    monkeypatch.setattr(trained, "ADMIN_TOKEN", "secret")
+    return path
+
+
+def post_reload(server):
+    async def call():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            return await client.post("/api/admin/reload", headers={"X-Admin-Token": "secret"})
+
+    return asyncio.run(call())
+
+
+def test_templates_only_file_keeps_concepts(trained, knowledge):
+    concepts = {k: list(v) for k, v in trained.CONCEPTS.items()}
+    knowledge.write_text(json.dumps({"templates": ["Is it {}?", "Could it be {}?"]}))
+    assert post_reload(trained).status_code == 200
+    assert trained.CONCEPTS == concepts
+    assert trained.TEMPLATES == ["Is it {}?", "Could it be {}?"]
+    assert trained.answer_index.lookup("could it be a flower") == "yes"
+
+
+def test_concepts_only_file_keeps_templates(trained, knowledge):
+    templates = list(trained.TEMPLATES)
+    knowledge.write_text(json.dumps({"concepts": {"yes": ["a flower"], "no": ["a planet"]}}))
+    assert post_reload(trained).status_code == 200
+    assert trained.TEMPLATES == templates
+    assert trained.CONCEPTS == {"yes": ["a flower"], "no": ["a planet"]}
+    assert trained.answer_index.lookup("is it a planet") == "no"
+
+
+@pytest.mark.parametrize("content", [
+    "{not json",
+    json.dumps({"concepts": {"maybe": ["x"]}}),
+    json.dumps({"concepts": {"yes": "a plant"}}),
+    json.dumps({"templates": ["no placeholder"]}),
+])
+def test_malformed_file_is_rejected_and_old_model_kept(trained, knowledge, content):
+    before = (trained.model, trained.answer_index, trained.fallback)
+    concepts = {k: list(v) for k, v in trained.CONCEPTS.items()}
+    templates = list(trained.TEMPLATES)
+    knowledge.write_text(content)
+    r = post_reload(trained)
+    assert r.status_code == 400
+    assert r.json()["detail"].startswith("Reload failed")
+    assert (trained.model, trained.answer_index, trained.fallback) == before
+    assert trained.CONCEPTS == concepts and trained.TEMPLATES == templates
+    assert trained.reload_report["last_error"]
+
+
+def test_reload_swaps_model_index_and_fallback(trained, knowledge):
+    before = (trained.model, trained.answer_index, trained.fallback)
+    knowledge.write_text(json.dumps({"concepts": {"yes": ["a tulip"], "no": ["a car"]}}))
+    body = post_reload(trained).json()
+    after = (trained.model, trained.answer_index, trained.fallback)
+    assert all(a is not b for a, b in zip(after, before))
+    assert body["reloads"] >= 1 and body["last_error"] is None
+    assert trained.answer_index.lookup("is it a tulip") == "yes"
+    assert trained.answer_index.lookup("is it a flower") is None
+    assert trained.fallback.answer("is it a car") == "no"
+
+
+def test_reload_without_admin_token_is_hidden(trained, knowledge, monkeypatch):
+    monkeypatch.setattr(trained, "ADMIN_TOKEN", "")
+    assert post_reload(trained).status_code == 404
@@ -0,0 +1,251 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+
+import server
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    return clock
+
+
+def redis_store(ttl=60):
+    return server.RedisSessionStore(client=fakeredis.FakeAsyncRedis(decode_responses=True), ttl=ttl)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return server.MemorySessionStore(shards=4, ttl=60, max_entries=100)
+    return redis_store()
+
+
+def test_unknown_session_is_a_fresh_game(store):
+    assert run(store.snapshot("nobody")) == server.new_game_state()
+
+
+def test_advance_counts_until_the_budget_is_spent(store):
+    async def play():
+        results = [await store.advance("s", 2) for _ in range(4)]
+        return results, await store.snapshot("s")
+
+    results, state = run(play())
+    assert [counted for _, counted in results] == [True, True, True, False]
+    assert [s["question_count"] for s, _ in results] == [1, 2, 3, 3]
+    assert [s["game_over"] for s, _ in results] == [False, False, True, True]
+    assert state["question_count"] == 3 and state["game_over"]
+    assert not state["guessed_correctly"]
+
+
+def test_mark_guessed_ends_the_game_once(store):
+    async def play():
+        await store.advance("s", 20)
+        first = await store.mark_guessed("s")
+        second = await store.mark_guessed("s")
+        return first, second, await store.advance("s", 20)
+
+    (state, changed), (_, again), (after, counted) = run(play())
+    assert changed and not again and not counted
+    assert state["game_over"] and state["guessed_correctly"]
+    assert state["question_count"] == 1
+    assert after["question_count"] == 1
+
+
+def test_mark_guessed_after_game_over_keeps_the_loss(store):
+    async def play():
+        for _ in range(2):
+            await store.advance("s", 1)
+        return await store.mark_guessed("s")
+
+    state, changed = run(play())
+    assert not changed
+    assert state["game_over"] and not state["guessed_correctly"]
+
+
+def test_refund_uncounts_one_question(store):
+    async def play():
+        await store.advance("s", 20)
+        await store.advance("s", 20)
+        await store.refund("s")
+        await store.refund("nobody")
+        return await store.snapshot("s"), await store.snapshot("nobody")
+
+    state, other = run(play())
+    assert state["question_count"] == 1 and not state["game_over"]
+    assert other == server.new_game_state()
+
+
+def test_reset_keeps_the_target_unless_given(store):
+    async def play():
+        sid = await store.create("tulip")
+        await store.advance(sid, 20)
+        await store.mark_guessed(sid)
+        await store.reset(sid)
+        kept = await store.snapshot(sid)
+        await store.reset(sid, "daisy")
+        return kept, await store.snapshot(sid)
+
+    kept, changed = run(play())
+    assert kept == server.new_game_state("tulip")
+    assert changed == server.new_game_state("daisy")
+
+
+def test_updates_return_the_target(store):
+    async def play():
+        sid = await store.create("tulip")
+        return (await store.advance(sid, 20))[0], (await store.mark_guessed(sid))[0]
+
+    advanced, guessed = run(play())
+    assert advanced["target"] == guessed["target"] == "tulip"
+
+
+def test_sessions_are_independent(store):
+    async def play():
+        a, b = await store.create(), await store.create()
+        await store.advance(a, 20)
+        await store.mark_guessed(a)
+        return a != b, await store.snapshot(b)
+
+    distinct, other = run(play())
+    assert distinct
+    assert other == server.new_game_state()
+
+
+def test_reads_do_not_allocate(store):
+    async def play():
+        await store.snapshot("ghost")
+        await store.reset("ghost")
+        if isinstance(store, server.RedisSessionStore):
+            return await store.client.exists(store._key("ghost"))
+        return store.stats()["sessions"]
+
+    assert run(play()) == 0
+
+
+def test_status_polls_do_not_evict_live_games(clock):
+    store = server.MemorySessionStore(shards=1, ttl=60, max_entries=3)
+
+    async def play():
+        await store.advance("player", 20)
+        for i in range(5):
+            await store.snapshot(f"poll{i}")
+        return await store.snapshot("player")
+
+    assert run(play())["question_count"] == 1
+    assert store.evictions == 0
+
+
+def test_redis_ttl_is_set_and_refreshed():
+    store = redis_store(ttl=60)
+
+    async def play():
+        key = store._key("s")
+        ttls = []
+        await store.reset("s", "tulip")
+        ttls.append(await store.client.ttl(key))
+        await store.client.expire(key, 5)
+        await store.reset("s")
+        ttls.append(await store.client.ttl(key))
+        await store.client.expire(key, 5)
+        await store.advance("s", 20)
+        ttls.append(await store.client.ttl(key))
+        await store.client.expire(key, 5)
+        await store.mark_guessed("s")
+        ttls.append(await store.client.ttl(key))
+        await store.client.expire(key, 5)
+        await store.snapshot("s")
+        ttls.append(await store.client.ttl(key))
+        return ttls
+
+    assert all(55 <= ttl <= 60 for ttl in run(play()))
+
+
+def test_redis_expired_session_is_a_fresh_game(monkeypatch):
+    # fakeredis reads expiry times from time.time().
+    now = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    store = redis_store(ttl=1)
+
+    async def play():
+        sid = await store.create("tulip")
+        await store.advance(sid, 20)
+        now[0] += 0.5
+        alive = await store.snapshot(sid)
+        now[0] += 1.5
+        return alive, await store.snapshot(sid)
+
+    alive, expired = run(play())
+    assert alive["question_count"] == 1
+    assert expired == server.new_game_state()
+
+
+def test_memory_ttl_expires_idle_sessions(clock):
+    store = server.MemorySessionStore(shards=1, ttl=10, max_entries=100)
+
+    async def play():
+        await store.advance("idle", 20)
+        await store.advance("busy", 20)
+        clock.now += 6
+        await store.advance("busy", 20)
+        clock.now += 6
+        return await store.snapshot("idle"), await store.snapshot("busy")
+
+    idle, busy = run(play())
+    assert idle["question_count"] == 0
+    assert busy["question_count"] == 2
+    assert store.expirations == 1
+
+
+def test_memory_evicts_least_recently_used_per_shard(clock):
+    store = server.MemorySessionStore(shards=1, ttl=60, max_entries=2)
+
+    async def play():
+        for sid in ("a", "b"):
+            await store.advance(sid, 20)
+        await store.snapshot("a")
+        await store.advance("c", 20)
+        return {sid: (await store.snapshot(sid))["question_count"] for sid in ("a", "c", "b")}
+
+    counts = run(play())
+    assert counts["a"] == 1 and counts["c"] == 1
+    assert counts["b"] == 0
+    assert store.evictions >= 1
+
+
+def test_memory_shards_split_sessions_and_capacity():
+    store = server.MemorySessionStore(shards=4, ttl=60, max_entries=10)
+
+    async def play():
+        for i in range(40):
+            await store.advance(f"s{i}", 20)
+
+    run(play())
+    stats = store.stats()
+    assert stats["shards"] == 4 and stats["max_entries"] == 12
+    assert sum(1 for shard in store._shards if shard) > 1
+    assert all(len(shard) <= store.shard_capacity for shard in store._shards)
+    assert stats["sessions"] <= 12
+    assert stats["evictions"] == 40 - stats["sessions"]
+
+
+def test_memory_shard_is_stable_per_id():
+    store = server.MemorySessionStore(shards=8)
+    assert store._index("abc") == store._index("abc")
+    assert {store._index(f"s{i}") for i in range(200)} == set(range(8))